@@ -1,10 +1,10 @@
 from typing import List, Dict, Any, Optional, Tuple
 import os
-import json
 import time
 import random
 from dataclasses import dataclass
 
+from . import json_utils
 from .api_client import GameAPIClient, TargetsQueryParam, Actor, Location
 from .unit_mapping import UnitMapper
 from .chief_of_staff import ChiefOfStaff
@@ -74,7 +74,7 @@ class Secretary:
                         sp = mc.get('special_points') or {}
                     battlefield['special_points'] = sp
                     try:
-                        print(f"[INJECT] special_points={json.dumps(sp, ensure_ascii=False)}")
+                        print(f"[INJECT] special_points={json_utils.dumps(sp)}")
                     except Exception:
                         pass
                 except Exception:
@@ -118,7 +118,7 @@ class Secretary:
                 if isinstance(c, dict) and "x" in c and "y" in c:
                     centers_info.append({"brigade": b.get("code"), "center": {"x": int(c.get("x",0)), "y": int(c.get("y",0))}})
             if centers_info:
-                print(f"[INJECT] brigade_centers={json.dumps(centers_info, ensure_ascii=False)}")
+                print(f"[INJECT] brigade_centers={json_utils.dumps(centers_info)}")
         except Exception:
             pass
         res = self.llm.classify(text, context={"brigades_info": brigades_info, "battlefield": battlefield, "companies": companies}) or {}
@@ -242,7 +242,8 @@ class RecruitmentMinister:
 
     def plan_and_apply(self, battlefield: Dict[str, Any], brigades_info: List[Dict[str, Any]], task: Optional[str] = None) -> None:
         allies = battlefield.get("allies", [])
-        snap = self.company.snapshot()
+        # 仅用于统计数量与兵种组成，无需排序
+        snap = self.company.snapshot(sort_units=False)
         try:
             all_ids = {int(u.get("id")) for u in (allies or []) if isinstance(u.get("id"), int)}
         except Exception:
@@ -847,7 +848,7 @@ class AIHQ:
                         except Exception:
                             pass
                         try:
-                            print(f"[LLM_JSON][SecretaryTask] {json.dumps({'role': 'brigade', 'target': getattr(b, 'code', getattr(b, 'name', '')), 'text': raw_task, 'params': params}, ensure_ascii=False)}")
+                            print(f"[LLM_JSON][SecretaryTask] {json_utils.dumps({'role': 'brigade', 'target': getattr(b, 'code', getattr(b, 'name', '')), 'text': raw_task, 'params': params})}")
                         except Exception:
                             pass
                         try:
@@ -867,7 +868,7 @@ class AIHQ:
                     try:
                         self.logistics_runner.set_task({"task": raw_task or task, "params": params})
                         try:
-                            print(f"[LLM_JSON][SecretaryTask] {json.dumps({'role': 'logistics', 'target': 'logistics', 'text': raw_task or task, 'params': params}, ensure_ascii=False)}")
+                            print(f"[LLM_JSON][SecretaryTask] {json_utils.dumps({'role': 'logistics', 'target': 'logistics', 'text': raw_task or task, 'params': params})}")
                             if getattr(self, 'command_parser', None):
                                 setattr(self.command_parser, '_logistics_task_text', str(getattr(self.command_parser, '_last_strategic_input', '') or (raw_task or task)))
                         except Exception:
@@ -882,7 +883,7 @@ class AIHQ:
                     try:
                         self.recruitment_runner.set_task({"task": raw_task or task, "params": params})
                         try:
-                            print(f"[LLM_JSON][SecretaryTask] {json.dumps({'role': 'recruitment', 'target': 'recruitment', 'text': raw_task or task, 'params': params}, ensure_ascii=False)}")
+                            print(f"[LLM_JSON][SecretaryTask] {json_utils.dumps({'role': 'recruitment', 'target': 'recruitment', 'text': raw_task or task, 'params': params})}")
                             if getattr(self, 'command_parser', None):
                                 setattr(self.command_parser, '_recruitment_task_text', str(getattr(self.command_parser, '_last_strategic_input', '') or (raw_task or task)))
                         except Exception:
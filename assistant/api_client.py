@@ -6,11 +6,15 @@ OpenRA 助手程序 - API客户端
 所有的通信都是通过socket连接完成的。
 """
 
+import asyncio
 import socket
 import json
+import threading
 import time
 import uuid
+from collections import OrderedDict
 from typing import List, Dict, Any, Optional, Tuple
+from . import json_utils
 from .unit_mapping import UnitMapper
 
 # API版本常量
@@ -28,6 +32,8 @@ class GameAPIError(Exception):
 
 class Location:
     """位置类，表示游戏中的坐标"""
+    __slots__ = ("x", "y")
+
     def __init__(self, x: int, y: int):
         self.x = x
         self.y = y
@@ -38,6 +44,8 @@ class Location:
 
 class Actor:
     """单位类，表示游戏中的单位"""
+    __slots__ = ("actor_id", "type", "faction", "position", "hp", "max_hp", "is_dead")
+
     def __init__(self, actor_id: int, type: str = None, faction: str = None, position: Location = None, hp: int = None, max_hp: int = None, is_dead: bool = False):
         self.actor_id = actor_id
         self.type = type
@@ -50,6 +58,8 @@ class Actor:
 
 class TargetsQueryParam:
     """目标查询参数类，用于查询符合条件的单位"""
+    __slots__ = ("type", "faction", "range", "restrain", "actorId")
+
     def __init__(self, type: List[str] = None, faction: str = None, range: str = "all", restrain: List[dict] = None, actorId: List[int] = None):
         self.type = type or []
         self.faction = faction
@@ -73,6 +83,9 @@ class GameAPIClient:
     """游戏API客户端类，用于与游戏服务器进行通信"""
     MAX_RETRIES = 1
     RETRY_DELAY = 0.5
+    # query_actor 短期缓存：同一 tick 内相同查询只发一次请求
+    QUERY_CACHE_SIZE = 64
+    QUERY_CACHE_TTL = 0.5
 
     # ===== 依赖关系表（已废弃，交由游戏引擎判定）=====
     BUILDING_DEPENDENCIES: Dict[str, list] = {}
@@ -142,11 +155,102 @@ class GameAPIClient:
         self.language = language
         # 用于在查询阶段统一名称到英文代码（并对少数特例改回中文）
         self._unit_mapper = UnitMapper()
+        # query_actor 结果缓存：规范化参数JSON -> (写入时间, Actor列表)
+        self._query_cache: "OrderedDict[str, Tuple[float, List[Actor]]]" = OrderedDict()
+        self._query_cache_lock = threading.Lock()
+        # 已解析的服务器地址（避免每次请求都做一次 localhost 解析）
+        self._resolved_address: Optional[Tuple[int, Tuple]] = None
+
+    def _resolve_server_address(self) -> Tuple[int, Tuple]:
+        """解析并缓存服务器地址，优先使用IPv4（Windows 下 localhost 先试 ::1 会额外耗时）"""
+        if self._resolved_address is None:
+            host, port = self.server_address
+            infos = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+            infos.sort(key=lambda i: 0 if i[0] == socket.AF_INET else 1)
+            family, _, _, _, sockaddr = infos[0]
+            self._resolved_address = (family, sockaddr)
+        return self._resolved_address
+
+    def _open_connection(self, timeout: float) -> socket.socket:
+        """建立到游戏的TCP连接（服务器按一次请求一个连接的方式应答，连接无法复用）"""
+        family, sockaddr = self._resolve_server_address()
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        try:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.settimeout(timeout)
+            sock.connect(sockaddr)
+        except Exception:
+            sock.close()
+            # 地址可能已失效，下次重新解析
+            self._resolved_address = None
+            raise
+        return sock
+
+    def clear_query_cache(self) -> None:
+        """清空 query_actor 缓存（各 Runner 在每个 tick 开始时调用）"""
+        with self._query_cache_lock:
+            self._query_cache.clear()
+
+    def _get_cached_actors(self, key: bytes) -> Optional[List[Actor]]:
+        with self._query_cache_lock:
+            hit = self._query_cache.get(key)
+            if hit is None:
+                return None
+            if time.time() - hit[0] >= self.QUERY_CACHE_TTL:
+                self._query_cache.pop(key, None)
+                return None
+            self._query_cache.move_to_end(key)
+            return list(hit[1])
+
+    def _put_cached_actors(self, key: bytes, actors: List[Actor]) -> None:
+        with self._query_cache_lock:
+            self._query_cache[key] = (time.time(), list(actors))
+            self._query_cache.move_to_end(key)
+            while len(self._query_cache) > self.QUERY_CACHE_SIZE:
+                self._query_cache.popitem(last=False)
 
     def _generate_request_id(self) -> str:
         """生成唯一的请求ID"""
         return str(uuid.uuid4())
 
+    def _build_request(self, command: str, params: dict) -> Tuple[str, bytes]:
+        """组装请求报文，返回 (请求ID, UTF-8编码后的报文)"""
+        request_id = self._generate_request_id()
+        request_data = {
+            "apiVersion": API_VERSION,
+            "requestId": request_id,
+            "command": command,
+            "params": params,
+            "language": self.language
+        }
+        return request_id, json.dumps(request_data).encode('utf-8')
+
+    def _parse_response(self, response_data: str, request_id: str) -> dict:
+        """解析并校验响应报文"""
+        try:
+            response = json.loads(response_data)
+        except json.JSONDecodeError:
+            raise GameAPIError("INVALID_JSON", "服务器返回的不是有效的JSON格式")
+
+        # 验证响应格式
+        if not isinstance(response, dict):
+            raise GameAPIError("INVALID_RESPONSE", "服务器返回的响应格式无效")
+
+        # 检查请求ID匹配
+        if response.get("requestId") != request_id:
+            raise GameAPIError("REQUEST_ID_MISMATCH", "响应的请求ID不匹配")
+
+        # 处理错误响应
+        if response.get("status", 0) < 0:
+            error = response.get("error", {})
+            raise GameAPIError(
+                error.get("code", "UNKNOWN_ERROR"),
+                error.get("message", "未知错误"),
+                error.get("details")
+            )
+
+        return response
+
     def _send_request(self, command: str, params: dict) -> dict:
         '''通过socket和Game交互，发送信息并接收响应
 
@@ -161,59 +265,66 @@ class GameAPIClient:
             GameAPIError: 当API调用出现错误时
             ConnectionError: 当连接服务器失败时
         '''
-        request_id = self._generate_request_id()
-        request_data = {
-            "apiVersion": API_VERSION,
-            "requestId": request_id,
-            "command": command,
-            "params": params,
-            "language": self.language
-        }
+        request_id, payload = self._build_request(command, params)
 
         retries = 0
         while retries < self.MAX_RETRIES:
             try:
-                with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-                    sock.settimeout(10)  # 设置超时时间
-                    sock.connect(self.server_address)
-
+                with self._open_connection(10) as sock:  # 设置超时时间
                     # 发送请求
-                    json_data = json.dumps(request_data)
-                    sock.sendall(json_data.encode('utf-8'))
+                    sock.sendall(payload)
 
                     # 接收响应
                     response_data = self._receive_data(sock)
+                    return self._parse_response(response_data, request_id)
 
-                    try:
-                        response = json.loads(response_data)
+            except (socket.timeout, ConnectionError) as e:
+                retries += 1
+                if retries >= self.MAX_RETRIES:
+                    raise GameAPIError("CONNECTION_ERROR", f"连接服务器失败: {str(e)}")
+                time.sleep(self.RETRY_DELAY)
 
-                        # 验证响应格式
-                        if not isinstance(response, dict):
-                            raise GameAPIError("INVALID_RESPONSE", "服务器返回的响应格式无效")
+            except GameAPIError:
+                raise
 
-                        # 检查请求ID匹配
-                        if response.get("requestId") != request_id:
-                            raise GameAPIError("REQUEST_ID_MISMATCH", "响应的请求ID不匹配")
+            except Exception as e:
+                raise GameAPIError("UNEXPECTED_ERROR", f"发生未预期的错误: {str(e)}")
 
-                        # 处理错误响应
-                        if response.get("status", 0) < 0:
-                            error = response.get("error", {})
-                            raise GameAPIError(
-                                error.get("code", "UNKNOWN_ERROR"),
-                                error.get("message", "未知错误"),
-                                error.get("details")
-                            )
+    async def _asend_request(self, command: str, params: dict) -> dict:
+        '''_send_request 的协程版本：基于 asyncio 流，供 Runner 在事件循环中并发查询
 
-                        return response
+        Args:
+            command (str): 要执行的命令
+            params (dict): 命令相关的数据参数
 
-                    except json.JSONDecodeError:
-                        raise GameAPIError("INVALID_JSON", "服务器返回的不是有效的JSON格式")
+        Returns:
+            dict: 服务器返回的JSON响应数据
 
-            except (socket.timeout, ConnectionError) as e:
+        Raises:
+            GameAPIError: 当API调用出现错误时
+        '''
+        request_id, payload = self._build_request(command, params)
+        _, sockaddr = self._resolve_server_address()
+
+        retries = 0
+        while retries < self.MAX_RETRIES:
+            writer = None
+            try:
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(sockaddr[0], sockaddr[1]), timeout=10)
+                writer.write(payload)
+                await writer.drain()
+                # 服务器应答完毕后会关闭连接，读到EOF即为完整响应
+                response_data = await asyncio.wait_for(reader.read(), timeout=10)
+                if not response_data:
+                    raise GameAPIError("TIMEOUT", "接收响应超时")
+                return self._parse_response(response_data.decode('utf-8'), request_id)
+
+            except (asyncio.TimeoutError, ConnectionError) as e:
                 retries += 1
                 if retries >= self.MAX_RETRIES:
                     raise GameAPIError("CONNECTION_ERROR", f"连接服务器失败: {str(e)}")
-                time.sleep(self.RETRY_DELAY)
+                await asyncio.sleep(self.RETRY_DELAY)
 
             except GameAPIError:
                 raise
@@ -221,6 +332,13 @@ class GameAPIClient:
             except Exception as e:
                 raise GameAPIError("UNEXPECTED_ERROR", f"发生未预期的错误: {str(e)}")
 
+            finally:
+                if writer is not None:
+                    try:
+                        writer.close()
+                    except Exception:
+                        pass
+
     def _receive_data(self, sock: socket.socket) -> str:
         """从socket接收完整的响应数据"""
         chunks = []
@@ -321,41 +439,68 @@ class GameAPIClient:
         except Exception as e:
             raise GameAPIError("QUERY_CONTROL_POINTS_ERROR", f"查询据点信息时发生错误: {str(e)}")
 
+    def _prepare_query_actor(self, query_params: TargetsQueryParam) -> Tuple[dict, bytes]:
+        """规范化查询参数，返回 (请求参数, 缓存键)"""
+        # 统一处理查询中的类型：将中文/同义词映射为英文代码，但对少数特例改为中文
+        params_dict = query_params.to_dict()
+        raw_types = params_dict.get("type", []) or []
+        if raw_types:
+            params_dict["type"] = self._normalize_query_types_for_engine(raw_types)
+        cache_key = json_utils.canonical(params_dict)
+        return {"targets": params_dict}, cache_key
+
+    def _parse_actors(self, result: Any) -> List[Actor]:
+        """将 query_actor 的响应数据转换为 Actor 列表"""
+        actors = []
+        actors_data = result.get("actors", []) if result else []
+        
+        for actor_data in actors_data:
+            try:
+                position = Location(
+                    actor_data["position"]["x"],
+                    actor_data["position"]["y"]
+                ) if "position" in actor_data else None
+                
+                actor = Actor(
+                    actor_id=actor_data["id"],
+                    type=actor_data.get("type"),
+                    faction=actor_data.get("faction"),
+                    position=position,
+                    hp=actor_data.get("hp"),
+                    max_hp=actor_data.get("maxHp"),
+                    is_dead=actor_data.get("isDead", False)
+                )
+                actors.append(actor)
+            except KeyError as e:
+                raise GameAPIError("INVALID_ACTOR_DATA", f"Actor数据格式无效: {str(e)}")
+        return actors
+
     def query_actor(self, query_params: TargetsQueryParam) -> List[Actor]:
         """查询符合条件的单位"""
         try:
-            # 统一处理查询中的类型：将中文/同义词映射为英文代码，但对少数特例改为中文
-            params_dict = query_params.to_dict()
-            raw_types = params_dict.get("type", []) or []
-            if raw_types:
-                params_dict["type"] = self._normalize_query_types_for_engine(raw_types)
-            params = {"targets": params_dict}
+            params, cache_key = self._prepare_query_actor(query_params)
+            cached = self._get_cached_actors(cache_key)
+            if cached is not None:
+                return cached
             response = self._send_request("query_actor", params)
-            result = self._handle_response(response)
-            
-            actors = []
-            actors_data = result.get("actors", []) if result else []
-            
-            for actor_data in actors_data:
-                try:
-                    position = Location(
-                        actor_data["position"]["x"],
-                        actor_data["position"]["y"]
-                    ) if "position" in actor_data else None
-                    
-                    actor = Actor(
-                        actor_id=actor_data["id"],
-                        type=actor_data.get("type"),
-                        faction=actor_data.get("faction"),
-                        position=position,
-                        hp=actor_data.get("hp"),
-                        max_hp=actor_data.get("maxHp"),
-                        is_dead=actor_data.get("isDead", False)
-                    )
-                    actors.append(actor)
-                except KeyError as e:
-                    raise GameAPIError("INVALID_ACTOR_DATA", f"Actor数据格式无效: {str(e)}")
-            
+            actors = self._parse_actors(self._handle_response(response))
+            self._put_cached_actors(cache_key, actors)
+            return actors
+        except GameAPIError:
+            raise
+        except Exception as e:
+            raise GameAPIError("QUERY_ACTOR_ERROR", f"查询Actor时发生错误: {str(e)}")
+
+    async def aquery_actor(self, query_params: TargetsQueryParam) -> List[Actor]:
+        """查询符合条件的单位（协程版本，与 query_actor 共用缓存）"""
+        try:
+            params, cache_key = self._prepare_query_actor(query_params)
+            cached = self._get_cached_actors(cache_key)
+            if cached is not None:
+                return cached
+            response = await self._asend_request("query_actor", params)
+            actors = self._parse_actors(self._handle_response(response))
+            self._put_cached_actors(cache_key, actors)
             return actors
         except GameAPIError:
             raise
@@ -1,8 +1,9 @@
+import asyncio
 import threading
 import time
-import json
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Tuple
 
+from . import json_utils
 from .api_client import GameAPIClient, TargetsQueryParam, Location
 
 
@@ -34,7 +35,7 @@ class BrigadeRunner:
             else:
                 self._tasks.pop(brigade_name, None)
         try:
-            print(f"[DEBUG][BrigadeRunner] set_task {brigade_name}: {json.dumps(task, ensure_ascii=False) if task else 'clear'}")
+            print(f"[DEBUG][BrigadeRunner] set_task {brigade_name}: {json_utils.dumps(task) if task else 'clear'}")
         except Exception:
             pass
 
@@ -60,7 +61,7 @@ class BrigadeRunner:
                 elif task is not None:
                     raw = str(task).strip()
                 try:
-                    print(f"[LLM_JSON][SecretaryTask] {json.dumps({'role': 'brigade', 'target': target_code, 'text': raw, 'params': params}, ensure_ascii=False)}")
+                    print(f"[LLM_JSON][SecretaryTask] {json_utils.dumps({'role': 'brigade', 'target': target_code, 'text': raw, 'params': params})}")
                 except Exception:
                     pass
                 try:
@@ -137,168 +138,189 @@ class BrigadeRunner:
         except Exception:
             pass
 
-    def _loop(self):
-        while self._running:
+    def _prepare_brigade(self, b, snap: Dict[str, Any], enemies: List[Dict[str, Any]]) -> Optional[Tuple[str, Optional[str], Dict[str, Any], List[str], Dict[str, List[int]]]]:
+        """构建单个旅的派遣输入；旅下无连队时返回 None"""
+        name = getattr(b, 'name', '')
+        if not self.ai_hq.company.has_companies(name):
             try:
-                snap = self.ai_hq.staff.snapshot()
+                with self._lock:
+                    self._tasks.pop(name, None)
+            except Exception:
+                pass
+            try:
+                cp = getattr(self.ai_hq, 'command_parser', None)
+                if cp:
+                    d = dict(getattr(cp, '_brigade_task_texts', {}) or {})
+                    d[name] = "休眠中"
+                    setattr(cp, '_brigade_task_texts', d)
+            except Exception:
+                pass
+            return None
+        with self._lock:
+            tm = self._tasks.get(name) or {}
+        allowed_companies = self.ai_hq.company.get_company_names_for_brigade(name)
+        company_units = {}
+        for cname in allowed_companies:
+            comp = b.companies.get(cname)
+            company_units[cname] = list(getattr(comp, 'unit_ids', []) or []) if comp else []
+        centers = self._compute_company_centers(company_units)
+        mission = None
+        with self._lock:
+            mission = (self._tasks.get(name) or {}).get("mission") or None
+        bc = getattr(b, 'center', None)
+        brigade_center = {"x": int(bc.get("x")), "y": int(bc.get("y"))} if isinstance(bc, dict) else {"x": 0, "y": 0}
+        zone = {"enemies": enemies, "companies": allowed_companies, "company_units": company_units, "company_centers": centers, "brigade_center": brigade_center}
+        try:
+            print(f"[INJECT] company_centers={json_utils.dumps(centers)}")
+        except Exception:
+            pass
+        try:
+            print(f"[INJECT] brigade_center={name}:{json_utils.dumps(brigade_center)}")
+        except Exception:
+            pass
+        try:
+            cp = getattr(self.ai_hq, 'command_parser', None)
+            mc = getattr(cp, 'map_cache', {}) if cp else {}
+            eb = snap.get("enemy_base") or mc.get('last_enemy_base') or mc.get('estimated_enemy_base')
+            if (not eb) and cp and hasattr(cp, '_estimate_enemy_base_location'):
+                cp._estimate_enemy_base_location()
+                mc = getattr(cp, 'map_cache', mc)
+                eb = mc.get('last_enemy_base') or mc.get('estimated_enemy_base')
+            zone["enemy_base"] = eb
+            zone["enemy_base_observed"] = bool(mc.get('enemy_base_real_observed'))
+            sp = mc.get('special_points') or {}
+            if (not sp) and cp and hasattr(cp, '_auto_calculate_map_info'):
+                cp._auto_calculate_map_info()
+                mc = getattr(cp, 'map_cache', mc)
+                sp = mc.get('special_points') or {}
+            zone["map_points"] = sp
+            try:
+                print(f"[INJECT] special_points={json_utils.dumps(sp)}")
+            except Exception:
+                pass
+            try:
+                if eb:
+                    print(f"[INJECT] enemy_base={json_utils.dumps(eb)}")
+            except Exception:
+                pass
+        except Exception:
+            pass
+        return name, mission, zone, allowed_companies, company_units
+
+    def _apply_plan(self, name: str, mission: Optional[str], plan: Dict[str, Any], company_units: Dict[str, List[int]]) -> None:
+        try:
+            print(f"[LLM_JSON][Brigade] {json_utils.dumps(plan)}")
+        except Exception:
+            try:
+                print(f"[LLM_JSON][Brigade] {str(plan)}")
+            except Exception:
+                pass
+        dispatch = plan.get("dispatch") or []
+        tools = plan.get("tools") or []
+        pass
+        # 兼容 company_code：转换为名称
+        try:
+            resolved_dispatch = []
+            for d in dispatch:
+                cname = str(d.get("company") or "").strip()
+                ccode = str(d.get("company_code") or "").strip()
+                if not cname and ccode:
+                    name_by_code = self.ai_hq.company.get_company_name_by_code(ccode)
+                    if name_by_code:
+                        d = dict(d)
+                        d["company"] = name_by_code
+                resolved_dispatch.append(d)
+        except Exception:
+            resolved_dispatch = dispatch
+        try:
+            for d in resolved_dispatch:
+                cname = str(d.get("company") or "")
+                loc = d.get("location") or {}
+                if cname and loc and (str((self._tasks.get(name) or {}).get("mission") or "") != "patrol_base"):
+                    self.ai_hq.company_attack_runner.set_task(cname, loc)
+        except Exception:
+            pass
+        for t in tools:
+            if not isinstance(t, dict):
+                continue
+            op = str(t.get("op") or "")
+            if op == "relocate":
                 try:
-                    self.ai_hq._update_brigade_zones(snap)
+                    tc = str(t.get("company_code") or "").strip()
+                    tn = str(t.get("company") or "").strip()
+                    if (not tn) and tc:
+                        by_code = self.ai_hq.company.get_company_name_by_code(tc)
+                        if by_code:
+                            tn = by_code
+                    loc = t.get("location") or {}
+                    mx = int(loc.get("x", 0)); my = int(loc.get("y", 0))
+                    ids = list(company_units.get(tn) or [])
+                    if ids and isinstance(mx, int) and isinstance(my, int):
+                        actors = self.ai_hq.api.query_actor(TargetsQueryParam(actorId=ids))
+                        mode = str(t.get("mode") or "").lower()
+                        am = (mode == "attack")
+                        asm = (mode == "assault")
+                        self.ai_hq.api.move_units_by_location(actors, Location(mx, my), am, asm)
                 except Exception:
                     pass
-                enemies = snap.get("enemies", [])
-                for b in self.ai_hq.brigades:
-                    name = getattr(b, 'name', '')
-                    if not self.ai_hq.company.has_companies(name):
-                        try:
-                            with self._lock:
-                                self._tasks.pop(name, None)
-                        except Exception:
-                            pass
-                        try:
-                            cp = getattr(self.ai_hq, 'command_parser', None)
-                            if cp:
-                                d = dict(getattr(cp, '_brigade_task_texts', {}) or {})
-                                d[name] = "休眠中"
-                                setattr(cp, '_brigade_task_texts', d)
-                        except Exception:
-                            pass
-                        continue
-                    with self._lock:
-                        tm = self._tasks.get(name) or {}
-                    allowed_companies = self.ai_hq.company.get_company_names_for_brigade(name)
-                    company_units = {}
-                    for cname in allowed_companies:
-                        comp = b.companies.get(cname)
-                        company_units[cname] = list(getattr(comp, 'unit_ids', []) or []) if comp else []
-                    centers = self._compute_company_centers(company_units)
-                    mission = None
+            elif op == "complete_task":
+                with self._lock:
+                    self._tasks.pop(name, None)
+                try:
+                    cp = getattr(self.ai_hq, 'command_parser', None)
+                    if cp:
+                        d = dict(getattr(cp, '_brigade_task_texts', {}) or {})
+                        d[name] = "自主决策中"
+                        setattr(cp, '_brigade_task_texts', d)
+                except Exception:
+                    pass
+        try:
+            meta = plan.get("meta") or {}
+            if bool(meta.get("task_complete")):
+                raw = str(((self._tasks.get(name) or {}).get("mission_raw") or mission or "")).strip()
+                standby_words = ["待命", "驻守", "守卫", "巡逻", "集结"]
+                if any(w for w in standby_words if w in raw):
+                    pass
+                else:
                     with self._lock:
-                        mission = (self._tasks.get(name) or {}).get("mission") or None
-                    bc = getattr(b, 'center', None)
-                    brigade_center = {"x": int(bc.get("x")), "y": int(bc.get("y"))} if isinstance(bc, dict) else {"x": 0, "y": 0}
-                    zone = {"enemies": enemies, "companies": allowed_companies, "company_units": company_units, "company_centers": centers, "brigade_center": brigade_center}
-                    try:
-                        print(f"[INJECT] company_centers={json.dumps(centers, ensure_ascii=False)}")
-                    except Exception:
-                        pass
-                    try:
-                        print(f"[INJECT] brigade_center={name}:{json.dumps(brigade_center, ensure_ascii=False)}")
-                    except Exception:
-                        pass
+                        self._tasks.pop(name, None)
                     try:
                         cp = getattr(self.ai_hq, 'command_parser', None)
-                        mc = getattr(cp, 'map_cache', {}) if cp else {}
-                        eb = snap.get("enemy_base") or mc.get('last_enemy_base') or mc.get('estimated_enemy_base')
-                        if (not eb) and cp and hasattr(cp, '_estimate_enemy_base_location'):
-                            cp._estimate_enemy_base_location()
-                            mc = getattr(cp, 'map_cache', mc)
-                            eb = mc.get('last_enemy_base') or mc.get('estimated_enemy_base')
-                        zone["enemy_base"] = eb
-                        zone["enemy_base_observed"] = bool(mc.get('enemy_base_real_observed'))
-                        sp = mc.get('special_points') or {}
-                        if (not sp) and cp and hasattr(cp, '_auto_calculate_map_info'):
-                            cp._auto_calculate_map_info()
-                            mc = getattr(cp, 'map_cache', mc)
-                            sp = mc.get('special_points') or {}
-                        zone["map_points"] = sp
-                        try:
-                            print(f"[INJECT] special_points={json.dumps(sp, ensure_ascii=False)}")
-                        except Exception:
-                            pass
-                        try:
-                            if eb:
-                                print(f"[INJECT] enemy_base={json.dumps(eb, ensure_ascii=False)}")
-                        except Exception:
-                            pass
+                        if cp:
+                            d = dict(getattr(cp, '_brigade_task_texts', {}) or {})
+                            d[name] = "自主决策中"
+                            setattr(cp, '_brigade_task_texts', d)
                     except Exception:
                         pass
-                    plan = self.ai_hq.llm_brigade.plan_dispatch(zone, mission or "engage_nearby", allowed_companies)
-                    try:
-                        print(f"[LLM_JSON][Brigade] {json.dumps(plan, ensure_ascii=False)}")
-                    except Exception:
-                        try:
-                            print(f"[LLM_JSON][Brigade] {str(plan)}")
-                        except Exception:
-                            pass
-                    dispatch = plan.get("dispatch") or []
-                    tools = plan.get("tools") or []
+        except Exception:
+            pass
+
+    async def _plan_all(self, jobs: List[Tuple[str, Optional[str], Dict[str, Any], List[str], Dict[str, List[int]]]]) -> List[Dict[str, Any]]:
+        # 各旅派遣规划互不依赖，并发请求LLM
+        llm = self.ai_hq.llm_brigade
+        results = await asyncio.gather(
+            *(llm.plan_dispatch_async(zone, mission or "engage_nearby", allowed) for _name, mission, zone, allowed, _units in jobs),
+            return_exceptions=True,
+        )
+        return [r if isinstance(r, dict) else {} for r in results]
+
+    def _loop(self):
+        while self._running:
+            try:
+                snap = self.ai_hq.staff.snapshot()
+                try:
+                    self.ai_hq._update_brigade_zones(snap)
+                except Exception:
                     pass
-                    # 兼容 company_code：转换为名称
-                    try:
-                        resolved_dispatch = []
-                        for d in dispatch:
-                            cname = str(d.get("company") or "").strip()
-                            ccode = str(d.get("company_code") or "").strip()
-                            if not cname and ccode:
-                                name_by_code = self.ai_hq.company.get_company_name_by_code(ccode)
-                                if name_by_code:
-                                    d = dict(d)
-                                    d["company"] = name_by_code
-                            resolved_dispatch.append(d)
-                    except Exception:
-                        resolved_dispatch = dispatch
-                    try:
-                        for d in resolved_dispatch:
-                            cname = str(d.get("company") or "")
-                            loc = d.get("location") or {}
-                            if cname and loc and (str((self._tasks.get(name) or {}).get("mission") or "") != "patrol_base"):
-                                self.ai_hq.company_attack_runner.set_task(cname, loc)
-                    except Exception:
-                        pass
-                    for t in tools:
-                        if not isinstance(t, dict):
-                            continue
-                        op = str(t.get("op") or "")
-                        if op == "relocate":
-                            try:
-                                tc = str(t.get("company_code") or "").strip()
-                                tn = str(t.get("company") or "").strip()
-                                if (not tn) and tc:
-                                    by_code = self.ai_hq.company.get_company_name_by_code(tc)
-                                    if by_code:
-                                        tn = by_code
-                                loc = t.get("location") or {}
-                                mx = int(loc.get("x", 0)); my = int(loc.get("y", 0))
-                                ids = list(company_units.get(tn) or [])
-                                if ids and isinstance(mx, int) and isinstance(my, int):
-                                    actors = self.ai_hq.api.query_actor(TargetsQueryParam(actorId=ids))
-                                    mode = str(t.get("mode") or "").lower()
-                                    am = (mode == "attack")
-                                    asm = (mode == "assault")
-                                    self.ai_hq.api.move_units_by_location(actors, Location(mx, my), am, asm)
-                            except Exception:
-                                pass
-                        elif op == "complete_task":
-                            with self._lock:
-                                self._tasks.pop(name, None)
-                            try:
-                                cp = getattr(self.ai_hq, 'command_parser', None)
-                                if cp:
-                                    d = dict(getattr(cp, '_brigade_task_texts', {}) or {})
-                                    d[name] = "自主决策中"
-                                    setattr(cp, '_brigade_task_texts', d)
-                            except Exception:
-                                pass
-                    try:
-                        meta = plan.get("meta") or {}
-                        if bool(meta.get("task_complete")):
-                            raw = str(((self._tasks.get(name) or {}).get("mission_raw") or mission or "")).strip()
-                            standby_words = ["待命", "驻守", "守卫", "巡逻", "集结"]
-                            if any(w for w in standby_words if w in raw):
-                                pass
-                            else:
-                                with self._lock:
-                                    self._tasks.pop(name, None)
-                                try:
-                                    cp = getattr(self.ai_hq, 'command_parser', None)
-                                    if cp:
-                                        d = dict(getattr(cp, '_brigade_task_texts', {}) or {})
-                                        d[name] = "自主决策中"
-                                        setattr(cp, '_brigade_task_texts', d)
-                                except Exception:
-                                    pass
-                    except Exception:
-                        pass
+                enemies = snap.get("enemies", [])
+                jobs = []
+                for b in self.ai_hq.brigades:
+                    job = self._prepare_brigade(b, snap, enemies)
+                    if job:
+                        jobs.append(job)
+                plans = asyncio.run(self._plan_all(jobs)) if jobs else []
+                for (name, mission, _zone, _allowed, company_units), plan in zip(jobs, plans):
+                    self._apply_plan(name, mission, plan, company_units)
             except Exception:
                 pass
             time.sleep(self._interval)
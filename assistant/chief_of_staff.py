@@ -1,8 +1,9 @@
-from typing import Dict, Any, List
+from collections import Counter
+from typing import Dict, Any, List, Tuple
 
 from .api_client import GameAPIClient, TargetsQueryParam
 from .unit_mapping import UnitMapper
-from .game_data_query import get_ally_combat_units, get_enemy_all_units
+from .game_data_query import get_battlefield_snapshot
 
 
 def _is_valid_unit(u_type: str) -> bool:
@@ -13,6 +14,13 @@ def _is_valid_unit(u_type: str) -> bool:
     return True
 
 
+def _coord_columns(units: List[Dict[str, Any]]) -> Tuple[List[int], List[int]]:
+    """一次性取出单位坐标列（x 列、y 列），供各辖区按下标筛选，避免每个辖区重复解析"""
+    xs = [int(u.get("x", 0)) for u in units]
+    ys = [int(u.get("y", 0)) for u in units]
+    return xs, ys
+
+
 class ChiefOfStaff:
     def __init__(self, api_client: GameAPIClient, unit_mapper: UnitMapper):
         self.api = api_client
@@ -39,11 +47,10 @@ class ChiefOfStaff:
         except Exception:
             map_info = {}
         try:
-            allies = get_ally_combat_units(self.api, self.mapper)
+            allies, enemies_raw = get_battlefield_snapshot(self.api, self.mapper)
         except Exception:
-            allies = []
+            allies, enemies_raw = [], []
         try:
-            enemies_raw = get_enemy_all_units(self.api, self.mapper)
             # 过滤残骸
             enemies = [e for e in enemies_raw if _is_valid_unit(e.get("type"))]
         except Exception:
@@ -142,34 +149,29 @@ class ChiefOfStaff:
         try:
             allies = data.get("allies") or []
             enemies = data.get("enemies") or []
+            # 坐标按列提取一次，各辖区只做区间比较
+            a_rows = list(zip(allies, *_coord_columns(allies)))
+            e_rows = list(zip(enemies, *_coord_columns(enemies)))
             for b in (brigades_info or []):
                 name = b.get("name") or ""
                 bd = b.get("bounds") or {}
                 x0 = int(bd.get("x0", 0)); y0 = int(bd.get("y0", 0)); x1 = int(bd.get("x1", 0)); y1 = int(bd.get("y1", 0))
-                def in_bounds(x: int, y: int) -> bool:
-                    return x >= x0 and x <= x1 and y >= y0 and y <= y1
-                a_zone = [u for u in allies if in_bounds(int(u.get("x", 0)), int(u.get("y", 0)))]
-                e_zone = [u for u in enemies if in_bounds(int(u.get("x", 0)), int(u.get("y", 0)))]
+                a_zone = [u for u, x, y in a_rows if x0 <= x <= x1 and y0 <= y <= y1]
+                e_in = [(u, x, y) for u, x, y in e_rows if x0 <= x <= x1 and y0 <= y <= y1]
+                e_zone = [u for u, _, _ in e_in]
                 cx = (x0 + x1) // 2
                 cy = (y0 + y1) // 2
                 nearest = None
                 best = 10**9
-                for e in e_zone:
-                    ex = int(e.get("x", 0)); ey = int(e.get("y", 0))
+                for e, ex, ey in e_in:
                     d = abs(ex - cx) + abs(ey - cy)
                     if d < best:
                         best = d
                         nearest = {"id": e.get("id"), "type": e.get("type"), "x": ex, "y": ey, "distance": d}
                 ac = len(a_zone)
                 ec = len(e_zone)
-                atypes: Dict[str, int] = {}
-                etypes: Dict[str, int] = {}
-                for u in a_zone:
-                    t = str(u.get("type") or "")
-                    atypes[t] = atypes.get(t, 0) + 1
-                for u in e_zone:
-                    t = str(u.get("type") or "")
-                    etypes[t] = etypes.get(t, 0) + 1
+                atypes = dict(Counter(str(u.get("type") or "") for u in a_zone))
+                etypes = dict(Counter(str(u.get("type") or "") for u in e_zone))
                 zones[name] = {"allies": a_zone, "enemies": e_zone, "bounds": bd, "summary": {"allies_count": ac, "enemies_count": ec, "allies_types": atypes, "enemies_types": etypes, "center": {"x": cx, "y": cy}, "nearest_enemy": nearest}}
         except Exception:
             zones = {}
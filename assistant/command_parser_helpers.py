@@ -6,22 +6,39 @@ OpenRA 助手程序 - 命令解析器辅助方法
 """
 
 import time
+from collections import defaultdict
 from typing import List, Dict, Any
 from .api_client import GameAPIClient, TargetsQueryParam
 from .unit_mapping import UnitMapper
 
 
+def _format_stats_lines(actor_stats: Dict[str, Dict[str, Any]]) -> str:
+    """按类型统计生成概览行"""
+    return "\n".join(f"- {stats['type_name']}: {stats['count']}个" for stats in actor_stats.values())
+
+
+def _format_position_lines(position_info: List[Dict[str, Any]]) -> str:
+    """生成多建筑位置列表行"""
+    return "\n".join(f"- {info['type_name']}: ({info['position']['x']}, {info['position']['y']})" for info in position_info)
+
+
 def handle_unified_overview_query(api_client: GameAPIClient, unit_mapper: UnitMapper, faction: str, map_cache: Dict[str, Any] = None) -> Dict[str, Any]:
     """统一处理建筑和单位查询，返回所有类型的结果，与API返回保持一致"""
     try:
         # 直接查询指定派系的所有actor（建筑+单位）
-        all_actors = api_client.query_actor(TargetsQueryParam(faction=faction))
+        # API失败时不直接报错，先尝试下方的缓存回退
+        api_error = None
+        try:
+            all_actors = api_client.query_actor(TargetsQueryParam(faction=faction))
+        except Exception as e:
+            all_actors = []
+            api_error = e
         
         # 如果API查询有结果且是敌方，更新缓存
         if all_actors and faction == "敌方" and map_cache is not None:
             # 分离建筑和单位，更新对应缓存
             buildings_cache = {}
-            units_cache = {}
+            units_cache = defaultdict(int)
             saw_enemy_base = False
             
             building_codes = {"fact", "power", "barr", "proc", "weap", "dome", "apwr", "fix", "afld", "stek", "ftur", "tsla", "sam"}
@@ -48,7 +65,7 @@ def handle_unified_overview_query(api_client: GameAPIClient, unit_mapper: UnitMa
                         buildings_cache.setdefault(actor_code, []).append(pos)
                 else:
                     # 这是单位
-                    units_cache[actor.type] = units_cache.get(actor.type, 0) + 1
+                    units_cache[actor.type] += 1
             
             # 更新缓存
             if buildings_cache:
@@ -56,10 +73,10 @@ def handle_unified_overview_query(api_client: GameAPIClient, unit_mapper: UnitMa
             if units_cache:
                 map_cache["enemy_units_overview"] = {
                     "last_seen": int(time.time() * 1000),
-                    "stats": units_cache
+                    "stats": dict(units_cache)
                 }
         
-        # 如果API查询为空，尝试从缓存获取（仅限敌方）
+        # 如果API查询为空或失败，尝试从缓存获取（仅限敌方）
         if not all_actors and faction == "敌方" and map_cache:
             cached_actors = []
             actor_stats = {}
@@ -68,12 +85,11 @@ def handle_unified_overview_query(api_client: GameAPIClient, unit_mapper: UnitMa
             building_cache = map_cache.get("enemy_buildings", {})
             for building_code, positions in building_cache.items():
                 type_name = unit_mapper.get_primary_name(building_code) or building_code
-                if building_code not in actor_stats:
-                    actor_stats[building_code] = {"count": 0, "type_name": type_name}
+                stats = actor_stats.setdefault(building_code, {"count": 0, "type_name": type_name})
                 
                 for pos_data in positions:
                     if isinstance(pos_data, dict) and "x" in pos_data and "y" in pos_data:
-                        actor_stats[building_code]["count"] += 1
+                        stats["count"] += 1
                         cached_actors.append({
                             "type": building_code,
                             "type_name": type_name,
@@ -89,9 +105,7 @@ def handle_unified_overview_query(api_client: GameAPIClient, unit_mapper: UnitMa
             cached_base = map_cache.get("last_enemy_base")
             if cached_base and isinstance(cached_base, dict) and "x" in cached_base and "y" in cached_base:
                 type_name = unit_mapper.get_primary_name("fact") or "基地"
-                if "fact" not in actor_stats:
-                    actor_stats["fact"] = {"count": 0, "type_name": type_name}
-                actor_stats["fact"]["count"] += 1
+                actor_stats.setdefault("fact", {"count": 0, "type_name": type_name})["count"] += 1
                 cached_actors.append({
                     "type": "fact",
                     "type_name": type_name,
@@ -108,9 +122,7 @@ def handle_unified_overview_query(api_client: GameAPIClient, unit_mapper: UnitMa
                 unit_stats = units_overview.get("stats", {})
                 for unit_type, count in unit_stats.items():
                     type_name = unit_mapper.get_primary_name(unit_type) or unit_type
-                    if unit_type not in actor_stats:
-                        actor_stats[unit_type] = {"count": 0, "type_name": type_name}
-                    actor_stats[unit_type]["count"] += count
+                    actor_stats.setdefault(unit_type, {"count": 0, "type_name": type_name})["count"] += count
                     
                     # 为单位创建虚拟条目（无位置信息）
                     for _ in range(count):
@@ -125,10 +137,8 @@ def handle_unified_overview_query(api_client: GameAPIClient, unit_mapper: UnitMa
                         })
             
             if cached_actors:
-                overview_message = f"{faction}概览（基于缓存）:\n"
+                overview_message = f"{faction}概览（基于缓存）:\n" + _format_stats_lines(actor_stats)
                 total_count = sum(stats["count"] for stats in actor_stats.values())
-                for actor_type, stats in actor_stats.items():
-                    overview_message += f"- {stats['type_name']}: {stats['count']}个\n"
                 
                 return {
                     "success": True,
@@ -138,10 +148,14 @@ def handle_unified_overview_query(api_client: GameAPIClient, unit_mapper: UnitMa
                         "total_count": total_count,
                         "actor_stats": actor_stats,
                         "actors": cached_actors,
-                        "from_cache": True
+                        "from_cache": True,
+                        "source": "cache_fallback_due_to_api_error" if api_error is not None else "cache"
                     }
                 }
         
+        if api_error is not None:
+            return {"success": False, "message": f"查询{faction}概览时出错: {str(api_error)}"}
+        
         if not all_actors:
             return {"success": True, "message": f"未发现{faction}单位或建筑", "data": {"actors": [], "total_count": 0}}
         
@@ -152,13 +166,7 @@ def handle_unified_overview_query(api_client: GameAPIClient, unit_mapper: UnitMa
         
         for actor in all_actors:
             type_name = unit_mapper.get_primary_name(actor.type) or actor.type
-            if actor.type not in actor_stats:
-                actor_stats[actor.type] = {
-                    "count": 0,
-                    "type_name": type_name
-                }
-            
-            actor_stats[actor.type]["count"] += 1
+            actor_stats.setdefault(actor.type, {"count": 0, "type_name": type_name})["count"] += 1
             total_count += 1
             
             actor_list.append({
@@ -172,9 +180,7 @@ def handle_unified_overview_query(api_client: GameAPIClient, unit_mapper: UnitMa
             })
         
         # 生成概览信息
-        overview_message = f"{faction}概览:\n"
-        for actor_type, stats in actor_stats.items():
-            overview_message += f"- {stats['type_name']}: {stats['count']}个\n"
+        overview_message = f"{faction}概览:\n" + _format_stats_lines(actor_stats)
         
         return {
             "success": True,
@@ -263,10 +269,7 @@ def handle_building_position_query(api_client: GameAPIClient, unit_mapper: UnitM
                         info = position_info[0]
                         msg = f"找到{faction}{info['type_name']}（缓存），位置: ({info['position']['x']}, {info['position']['y']})"
                     else:
-                        msg = f"基于缓存找到{len(position_info)}个{faction}建筑:\n"
-                        for info in position_info:
-                            msg += f"- {info['type_name']}: ({info['position']['x']}, {info['position']['y']})\n"
-                        msg = msg.strip()
+                        msg = (f"基于缓存找到{len(position_info)}个{faction}建筑:\n" + _format_position_lines(position_info)).strip()
                     return {
                         "success": True,
                         "message": msg,
@@ -326,10 +329,7 @@ def handle_building_position_query(api_client: GameAPIClient, unit_mapper: UnitM
                     info = position_info[0]
                     msg = f"找到{faction}{info['type_name']}（缓存），位置: ({info['position']['x']}, {info['position']['y']})"
                 else:
-                    msg = f"基于缓存找到{len(position_info)}个{faction}建筑:\n"
-                    for info in position_info:
-                        msg += f"- {info['type_name']}: ({info['position']['x']}, {info['position']['y']})\n"
-                    msg = msg.strip()
+                    msg = (f"基于缓存找到{len(position_info)}个{faction}建筑:\n" + _format_position_lines(position_info)).strip()
                 return {
                     "success": True,
                     "message": msg,
@@ -375,10 +375,7 @@ def handle_building_position_query(api_client: GameAPIClient, unit_mapper: UnitM
             info = position_info[0]
             message = f"找到{faction}{info['type_name']}，位置: ({info['position']['x']}, {info['position']['y']})"
         else:
-            message = f"找到{len(position_info)}个{faction}建筑:\n"
-            for info in position_info:
-                message += f"- {info['type_name']}: ({info['position']['x']}, {info['position']['y']})\n"
-            message = message.strip()
+            message = (f"找到{len(position_info)}个{faction}建筑:\n" + _format_position_lines(position_info)).strip()
         
         return {
             "success": True,
@@ -1,27 +1,63 @@
+import asyncio
 import threading
-import time
-from typing import Optional, Dict, Any, List
+from dataclasses import dataclass
+from typing import Optional, Dict, Any, List, Union
 
-from .api_client import GameAPIClient, TargetsQueryParam
+from .api_client import Actor, GameAPIClient, TargetsQueryParam
 from .unit_mapping import UnitMapper
 from .llm_roles import LLMCompanyAttack
 from .doubao_client import DoubaoClient
 
 
+@dataclass
+class ZoneEnemy:
+    """作战区内的敌方单位（仅保留连长提示词需要的字段）"""
+    __slots__ = ("id", "type", "x", "y", "hp")
+    id: int
+    type: str
+    x: int
+    y: int
+    hp: float
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"id": self.id, "type": self.type, "x": self.x, "y": self.y, "hp": self.hp}
+
+
+@dataclass
+class ZoneAlly:
+    """作战区内的我方单位（不含血量以减少Token消耗）"""
+    __slots__ = ("id", "type", "x", "y")
+    id: int
+    type: str
+    x: int
+    y: int
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"id": self.id, "type": self.type, "x": self.x, "y": self.y}
+
+
 class CompanyAttackRunner:
     def __init__(self, ai_hq, client: Optional[DoubaoClient] = None):
         self.ai_hq = ai_hq
-        try:
-            use_client = client or DoubaoClient()
-        except Exception:
-            use_client = None
-        self.llm = LLMCompanyAttack(use_client)
+        # LLM 客户端延迟到首次需要规划时再创建
+        self._client = client
+        self._llm: Optional[LLMCompanyAttack] = None
         self._running = False
         self._thread: Optional[threading.Thread] = None
         self._interval = 5.0
         self._tasks: Dict[str, Dict[str, Any]] = {}
         self._lock = threading.Lock()
 
+    @property
+    def llm(self) -> LLMCompanyAttack:
+        if self._llm is None:
+            try:
+                use_client = self._client or DoubaoClient()
+            except Exception:
+                use_client = None
+            self._llm = LLMCompanyAttack(use_client)
+        return self._llm
+
     def start(self):
         if self._running:
             return
@@ -50,34 +86,37 @@ class CompanyAttackRunner:
         except Exception:
             return max(8, max(w, h) // 4)
 
-    def _gather_zone_units(self, center: Dict[str, int], radius: int, company_name: str) -> Dict[str, List[Dict[str, Any]]]:
+    async def _gather_zone_units(self, center: Dict[str, int], radius: int, company_name: str, enemy_actors: List[Actor]) -> Dict[str, List[Union[ZoneEnemy, ZoneAlly]]]:
         api = self.ai_hq.api
-        mapper = self.ai_hq.mapper
+        get_code = self.ai_hq.mapper.get_code
         cx = int(center.get("x", 0)); cy = int(center.get("y", 0))
+        r2 = radius * radius
         def in_circle(x: int, y: int) -> bool:
             dx = x - cx; dy = y - cy
-            return (dx * dx + dy * dy) <= radius * radius
-        enemies: List[Dict[str, Any]] = []
-        allies: List[Dict[str, Any]] = []
+            return (dx * dx + dy * dy) <= r2
+        enemies: List[ZoneEnemy] = []
+        allies: List[ZoneAlly] = []
         try:
-            for e in api.query_actor(TargetsQueryParam(faction="敌方")):
-                if not e.position:
+            for e in enemy_actors:
+                pos = e.position
+                if pos is None:
                     continue
-                ex = e.position.x; ey = e.position.y
+                ex = pos.x; ey = pos.y
                 if not in_circle(ex, ey):
                     continue
-                code = mapper.get_code(e.type) or e.type
+                etype = e.type
+                code = get_code(etype) or etype
                 code_str = str(code).lower()
                 # 过滤掉出生点标记(mpspawn)和残骸(husk/hask)
                 if code_str == "mpspawn" or "husk" in code_str or "hask" in code_str or "残骸" in code_str:
                     continue
                 
                 # 计算血量百分比 (保留2位小数)
-                hp = getattr(e, 'hp', 0) or 0
-                max_hp = getattr(e, 'maxHp', 1) or 1
+                hp = e.hp or 0
+                max_hp = e.max_hp or 1
                 hp_ratio = round(hp / max_hp, 2) if max_hp > 0 else 0.0
                 
-                enemies.append({"id": e.actor_id, "type": code, "x": ex, "y": ey, "hp": hp_ratio})
+                enemies.append(ZoneEnemy(e.actor_id, code, ex, ey, hp_ratio))
         except Exception:
             enemies = []
         try:
@@ -89,13 +128,15 @@ class CompanyAttackRunner:
                     break
             ids = list(getattr(comp, 'unit_ids', []) or []) if comp else []
             if ids:
-                for a in api.query_actor(TargetsQueryParam(actorId=ids)):
-                    if not a.position:
+                for a in await api.aquery_actor(TargetsQueryParam(actorId=ids)):
+                    pos = a.position
+                    if pos is None:
                         continue
-                    ax = a.position.x; ay = a.position.y
+                    ax = pos.x; ay = pos.y
                     if not in_circle(ax, ay):
                         continue
-                    code = mapper.get_code(a.type) or a.type
+                    atype = a.type
+                    code = get_code(atype) or atype
                     code_str = str(code).lower()
                     
                     # 己方过滤：非战斗单位不参与战术分配
@@ -104,38 +145,65 @@ class CompanyAttackRunner:
                         continue
                         
                     # 我方仅需要基础信息，移除血量以减少Token消耗
-                    allies.append({"id": a.actor_id, "type": code, "x": ax, "y": ay})
+                    allies.append(ZoneAlly(a.actor_id, code, ax, ay))
         except Exception:
             allies = []
         return {"enemies": enemies, "allies": allies}
 
-    def _loop(self):
+    def _plan_and_execute(self, counters_text: str, zone: Dict[str, Any], center: Dict[str, int], radius: int) -> None:
+        """同步部分：LLM 流式规划并下发攻击（在线程池中执行，避免阻塞事件循环）"""
+        plan = self.llm.plan_stream_execute(self.ai_hq.api, counters_text, zone, center, radius)
+        pairs = plan.get("pairs") or []
+        if pairs:
+            try:
+                enhancer = getattr(getattr(self.ai_hq, 'process', None), 'enhancer', None)
+                if enhancer and getattr(enhancer, 'enabled', False):
+                    tuples = [(int(p[0]), int(p[1])) for p in pairs if isinstance(p, list) and len(p) == 2]
+                    enhancer.enhance_execute(self.ai_hq.api, tuples)
+                else:
+                    self.llm.execute_pairs(self.ai_hq.api, pairs)
+            except Exception:
+                self.llm.execute_pairs(self.ai_hq.api, pairs)
+
+    async def _handle_company(self, cname: str, t: Dict[str, Any], radius: int, counters_text: str, enemy_actors: List[Actor]) -> None:
+        center = t.get("center") or {"x": 0, "y": 0}
+        zone = await self._gather_zone_units(center, radius, cname, enemy_actors)
+        if not zone.get("enemies") or not zone.get("allies"):
+            self.clear_task(cname)
+            return
+        await asyncio.to_thread(self._plan_and_execute, counters_text, zone, center, radius)
+
+    async def _loop_async(self):
+        api = self.ai_hq.api
         while self._running:
             try:
-                snap = self.ai_hq.staff.snapshot()
+                # 每个 tick 重新拉取：丢弃上一 tick 的查询缓存
+                try:
+                    api.clear_query_cache()
+                except Exception:
+                    pass
+                snap = await asyncio.to_thread(self.ai_hq.staff.snapshot)
                 m = snap.get("map") or {}
                 w = int(m.get("MapWidth") or m.get("width") or 128)
                 h = int(m.get("MapHeight") or m.get("height") or 128)
                 radius = self._compute_radius(w, h)
-                counters_text = self.llm.get_counters_text() if hasattr(self.llm, 'get_counters_text') else ""
-                for cname, t in list(self._tasks.items()):
-                    center = t.get("center") or {"x": 0, "y": 0}
-                    zone = self._gather_zone_units(center, radius, cname)
-                    if not zone.get("enemies") or not zone.get("allies"):
-                        self.clear_task(cname)
-                        continue
-                    plan = self.llm.plan_stream_execute(self.ai_hq.api, counters_text, zone, center, radius)
-                    pairs = plan.get("pairs") or []
-                    if pairs:
-                        try:
-                            enhancer = getattr(getattr(self.ai_hq, 'process', None), 'enhancer', None)
-                            if enhancer and getattr(enhancer, 'enabled', False):
-                                tuples = [(int(p[0]), int(p[1])) for p in pairs if isinstance(p, list) and len(p) == 2]
-                                enhancer.enhance_execute(self.ai_hq.api, tuples)
-                            else:
-                                self.llm.execute_pairs(self.ai_hq.api, pairs)
-                        except Exception:
-                            self.llm.execute_pairs(self.ai_hq.api, pairs)
+                with self._lock:
+                    tasks = list(self._tasks.items())
+                if tasks:
+                    counters_text = self.llm.get_counters_text() if hasattr(self.llm, 'get_counters_text') else ""
+                    # 敌方全量查询各连队共用，只发一次
+                    try:
+                        enemy_actors = await api.aquery_actor(TargetsQueryParam(faction="敌方"))
+                    except Exception:
+                        enemy_actors = []
+                    # 各连队的查询与规划并发进行
+                    await asyncio.gather(
+                        *[self._handle_company(cname, t, radius, counters_text, enemy_actors) for cname, t in tasks],
+                        return_exceptions=True,
+                    )
             except Exception:
                 pass
-            time.sleep(self._interval)
+            await asyncio.sleep(self._interval)
+
+    def _loop(self):
+        asyncio.run(self._loop_async())
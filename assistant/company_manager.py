@@ -1,6 +1,13 @@
-from typing import Dict, List, Optional
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+import re
 import time
 
+# 每个旅固定 3 个连队编号（bit i 置位 = 编号 i+1 已占用）
+_SLOT_MASK = 0b111
+_COMPANY_NAME_RE = re.compile(r"^brigade_(\d+)_company([1-3])$")
+_COMPANY_CODE_RE = re.compile(r"^company_(\d+)$")
+
 
 class CompanyManager:
     def __init__(self):
@@ -17,10 +24,24 @@ class CompanyManager:
             "brigade_4": "第四战区旅长",
         }
         self._brigade_name_to_code = {v: k for k, v in self._brigade_code_to_name.items()}
-        self._brigade_used_numbers: Dict[str, set] = {}
-        self._brigade_free_numbers: Dict[str, List[int]] = {}
+        # 旅代码/旅名 -> 该旅全部别名（查询时直接取用）
+        self._brigade_aliases: Dict[str, Tuple[str, ...]] = {}
+        for bcode, bname in self._brigade_code_to_name.items():
+            self._brigade_aliases[bcode] = (bcode, bname)
+            self._brigade_aliases[bname] = (bname, bcode)
+        self._brigade_mask: Dict[str, int] = {}
+        # 旅 -> 连队名 的增量索引（dict 作有序集合，保持创建顺序；未归属旅的连队记在 "" 下）
+        self._brigade_to_names: Dict[str, Dict[str, None]] = {}
+        # 各旅固定连队名（company1..3），避免每次重新格式化
+        self._brigade_slots: Dict[str, Tuple[str, str, str]] = {
+            bcode: self._make_slots(bcode) for bcode in self._brigade_code_to_name
+        }
         self._ensure_fixed_companies()
 
+    @staticmethod
+    def _make_slots(bcode: str) -> Tuple[str, str, str]:
+        return (f"{bcode}_company1", f"{bcode}_company2", f"{bcode}_company3")
+
     def _gen_name(self) -> str:
         self._seq += 1
         return f"连队-{self._seq}"
@@ -35,41 +56,59 @@ class CompanyManager:
             return self._brigade_name_to_code[b]
         return b
 
+    def _index_company(self, name: str) -> None:
+        meta = self.companies.get(name)
+        if meta is not None:
+            self._brigade_to_names.setdefault(str(meta.get("brigade") or ""), {})[name] = None
+
+    def _unindex_company(self, name: str) -> None:
+        meta = self.companies.get(name)
+        if meta is None:
+            return
+        bucket = self._brigade_to_names.get(str(meta.get("brigade") or ""))
+        if bucket is not None:
+            bucket.pop(name, None)
+
     def _alloc_company_number(self, brigade_code: str) -> int:
-        used = self._brigade_used_numbers.setdefault(brigade_code, set())
-        free = self._brigade_free_numbers.setdefault(brigade_code, [])
-        if free:
-            free.sort()
-            n = free.pop(0)
-            used.add(n)
-            return n
-        for n in (1, 2, 3):
-            if n not in used:
-                used.add(n)
-                return n
-        return 1
+        m = self._brigade_mask.get(brigade_code, 0)
+        free = ~m & _SLOT_MASK
+        if not free:
+            return 1
+        low = free & -free
+        self._brigade_mask[brigade_code] = m | low
+        return low.bit_length()
 
     def _free_number_for_name(self, name: str) -> None:
-        parts = str(name).split("_")
-        if len(parts) >= 3 and parts[0] == "brigade" and parts[2].startswith("company"):
-            try:
-                bcode = f"brigade_{int(parts[1])}"
-            except Exception:
-                bcode = None
-            try:
-                num_str = parts[2].replace("company", "")
-                num = int(num_str)
-            except Exception:
-                num = None
-            if bcode and num is not None:
-                used = self._brigade_used_numbers.setdefault(bcode, set())
-                free = self._brigade_free_numbers.setdefault(bcode, [])
-                if num in used:
-                    used.discard(num)
-                if num not in free:
-                    free.append(num)
+        m = _COMPANY_NAME_RE.match(str(name))
+        if not m:
+            return
+        bcode = f"brigade_{int(m.group(1))}"
+        num = int(m.group(2))
+        self._brigade_mask[bcode] = self._brigade_mask.get(bcode, 0) & ~(1 << (num - 1))
+
+    def _bump_code_seq(self, code: str) -> None:
+        # 保持不变式：_code_seq 不小于任何已登记的 company_NNN 编号
+        m = _COMPANY_CODE_RE.match(code)
+        if m:
+            self._code_seq = max(self._code_seq, int(m.group(1)))
+
+    def _fast_auto_create(self, n: str) -> str:
+        # 无名称/旅/代码的快速路径：_code_seq 不变式保证代码唯一，调用方已确认名称未占用
+        self._code_seq += 1
+        c = f"company_{self._code_seq:03d}"
+        self._code_to_name[c] = n
+        self._name_to_code[n] = c
+        self.companies[n] = {"units": set(), "brigade": None, "created_at": time.time(), "code": c}
+        self._index_company(n)
+        return n
 
     def create_company(self, name: Optional[str] = None, brigade: Optional[str] = None, code: Optional[str] = None) -> str:
+        if name is None and brigade is None and code is None:
+            n = self._gen_name()
+            if n not in self.companies:
+                return self._fast_auto_create(n)
+            # 自动名称已被显式占用：走常规路径去重
+            name = n
         bcode = self._normalize_brigade(brigade)
         if bcode:
             num = self._alloc_company_number(bcode)
@@ -90,42 +129,40 @@ class CompanyManager:
                 while f"{base}-{j}" in self._code_to_name:
                     j += 1
                 c = f"{base}-{j}"
+            self._bump_code_seq(c)
         else:
+            # 由不变式保证自动编号不会与已有代码冲突
             self._code_seq += 1
             c = f"company_{self._code_seq:03d}"
-            while c in self._code_to_name:
-                self._code_seq += 1
-                c = f"company_{self._code_seq:03d}"
+            assert c not in self._code_to_name, c
         self._code_to_name[c] = n
         self._name_to_code[n] = c
         self.companies[n] = {"units": set(), "brigade": brigade or bcode or None, "created_at": time.time(), "code": c}
+        self._index_company(n)
         return n
 
     def assign_units(self, company: str, unit_ids: List[int]) -> None:
         if company not in self.companies:
             return
-        for u in unit_ids or []:
-            uid = int(u)
-            prev = self.unit_to_company.get(uid)
+        batch = {int(u) for u in unit_ids or []}
+        if not batch:
+            return
+        # 按原属连队分组，一次性从各原连队中移除
+        moved: Dict[str, set] = defaultdict(set)
+        prev_of = self.unit_to_company.get
+        for uid in batch:
+            prev = prev_of(uid)
             if prev and prev != company:
-                comp_prev = self.companies.get(prev)
-                if comp_prev:
-                    comp_prev["units"].discard(uid)
-            self.unit_to_company[uid] = company
-            self.companies[company]["units"].add(uid)
+                moved[prev].add(uid)
+        for prev, uids in moved.items():
+            comp_prev = self.companies.get(prev)
+            if comp_prev:
+                comp_prev["units"] -= uids
+        self.companies[company]["units"] |= batch
+        self.unit_to_company.update(dict.fromkeys(batch, company))
 
     def add_units(self, company: str, unit_ids: List[int]) -> None:
-        if company not in self.companies:
-            return
-        for u in unit_ids or []:
-            uid = int(u)
-            prev = self.unit_to_company.get(uid)
-            if prev and prev != company:
-                comp_prev = self.companies.get(prev)
-                if comp_prev:
-                    comp_prev["units"].discard(uid)
-            self.unit_to_company[uid] = company
-            self.companies[company]["units"].add(uid)
+        self.assign_units(company, unit_ids)
 
     def remove_unit(self, unit_id: int) -> None:
         uid = int(unit_id)
@@ -147,6 +184,7 @@ class CompanyManager:
             if code:
                 self._code_to_name.pop(code, None)
             self._name_to_code.pop(company, None)
+            self._unindex_company(company)
             del self.companies[company]
 
     # 已删除残部机制，合并相关接口不再提供
@@ -156,21 +194,25 @@ class CompanyManager:
             return
         bcode = self._normalize_brigade(brigade)
         if not bcode:
+            self._unindex_company(company)
             self.companies[company]["brigade"] = brigade or None
+            self._index_company(company)
             return
         old_name = company
         old_meta = dict(self.companies[old_name])
         code = self._name_to_code.get(old_name)
-        target_slots = [f"{bcode}_company{n}" for n in (1, 2, 3)]
-        existing = {n: self.companies.get(n) for n in target_slots}
+        companies = self.companies
+        target_slots = self._brigade_slots.get(bcode) or self._make_slots(bcode)
         free_slot = None
         for n in target_slots:
-            if existing.get(n) is None:
+            if companies.get(n) is None:
                 free_slot = n
                 break
         if free_slot:
+            self._unindex_company(old_name)
             self.companies.pop(old_name, None)
             self.companies[free_slot] = {"units": old_meta.get("units", set()), "brigade": bcode, "created_at": old_meta.get("created_at"), "code": code}
+            self._index_company(free_slot)
             if code:
                 self._code_to_name[code] = free_slot
             self._name_to_code.pop(old_name, None)
@@ -182,25 +224,27 @@ class CompanyManager:
         else:
             min_name = None
             min_cnt = None
-            for n, meta in existing.items():
-                c = len((meta or {}).get("units", set())) if meta else 0
+            for n in target_slots:
+                meta = companies.get(n)
+                c = len(meta.get("units", set())) if meta else 0
                 if min_cnt is None or c < min_cnt:
                     min_cnt = c
                     min_name = n
             dst = min_name
             if dst:
-                for u in list(old_meta.get("units", set())):
-                    self.add_units(dst, [u])
+                self.assign_units(dst, list(old_meta.get("units", set())))
                 self._free_number_for_name(old_name)
+                self._unindex_company(old_name)
                 self.companies.pop(old_name, None)
                 if code:
                     self._code_to_name[code] = dst
                 self._name_to_code.pop(old_name, None)
 
-    def snapshot(self) -> Dict[str, object]:
+    def snapshot(self, sort_units: bool = True) -> Dict[str, object]:
+        """导出连队快照；需要稳定输出（序列化/对比）时保持 sort_units=True"""
         out: Dict[str, object] = {"companies": {}, "brigades": {}}
         for name, meta in self.companies.items():
-            units = sorted(list(meta["units"]))
+            units = sorted(meta["units"]) if sort_units else list(meta["units"])
             out["companies"][name] = {"units": units, "brigade": meta.get("brigade"), "created_at": meta.get("created_at"), "code": meta.get("code")}
             b = str(meta.get("brigade") or "")
             if b:
@@ -212,49 +256,41 @@ class CompanyManager:
 
     def get_companies_for_brigade(self, brigade: str) -> Dict[str, List[int]]:
         res: Dict[str, List[int]] = {}
-        targets = {brigade}
-        code = self._brigade_name_to_code.get(brigade)
-        name = self._brigade_code_to_name.get(brigade)
-        if code:
-            targets.add(code)
-        if name:
-            targets.add(name)
-        for name_key, meta in self.companies.items():
-            bval = str(meta.get("brigade") or "")
-            if bval in targets:
-                res[name_key] = sorted(list(meta.get("units") or []))
+        companies = self.companies
+        for key in self._brigade_aliases.get(brigade, (brigade,)):
+            for name_key in self._brigade_to_names.get(str(key or ""), ()):
+                res[name_key] = sorted(companies[name_key]["units"])
         return res
 
+    def _brigade_company_names(self, brigade: str) -> Dict[str, None]:
+        # 合并旅本身、旅名、旅代码三个桶（保持顺序去重）
+        names: Dict[str, None] = {}
+        for key in self._brigade_aliases.get(brigade, (brigade,)):
+            if not key:
+                continue
+            bucket = self._brigade_to_names.get(key)
+            if bucket:
+                names.update(bucket)
+        return names
+
     def get_company_names_for_brigade(self, brigade: str) -> List[str]:
-        names: List[str] = []
-        snap = self.snapshot()
-        names.extend(list(snap.get("brigades", {}).get(brigade, []) or []))
-        bname = self._brigade_code_to_name.get(brigade)
-        if bname:
-            names.extend(list(snap.get("brigades", {}).get(bname, []) or []))
-        bcode = self._brigade_name_to_code.get(brigade)
-        if bcode:
-            names.extend(list(snap.get("brigades", {}).get(bcode, []) or []))
-        names = list(dict.fromkeys(names))
-        filtered: List[str] = []
-        for n in names:
-            meta = snap.get("companies", {}).get(n) or {}
-            if len(meta.get("units") or []) > 0:
-                filtered.append(n)
-        return filtered
+        companies = self.companies
+        return [n for n in self._brigade_company_names(brigade) if companies[n]["units"]]
 
     def has_companies(self, brigade: str) -> bool:
-        return bool(self.get_company_names_for_brigade(brigade))
+        companies = self.companies
+        return any(companies[n]["units"] for n in self._brigade_company_names(brigade))
 
     def _ensure_fixed_companies(self) -> None:
-        for bcode in ["brigade_1", "brigade_2", "brigade_3", "brigade_4"]:
-            used = self._brigade_used_numbers.setdefault(bcode, set())
-            for n in (1, 2, 3):
-                name = f"{bcode}_company{n}"
+        for bcode, slots in self._brigade_slots.items():
+            for name in slots:
                 if name not in self.companies:
                     self._code_seq += 1
                     c = f"company_{self._code_seq:03d}"
                     self._code_to_name[c] = name
                     self._name_to_code[name] = c
                     self.companies[name] = {"units": set(), "brigade": bcode, "created_at": time.time(), "code": c}
-                used.add(n)
+                    self._index_company(name)
+            self._brigade_mask[bcode] = self._brigade_mask.get(bcode, 0) | _SLOT_MASK
+        for c in self._code_to_name:
+            self._bump_code_seq(c)
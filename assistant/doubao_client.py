@@ -7,13 +7,76 @@
 - 提供系统提示词模板注入（包含兵种克制关系占位符）
 """
 from __future__ import annotations
+import asyncio
 import os
 import json
 import time
 import importlib
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 # Ark SDK 将通过 _load_ark_class() 惰性加载，避免在包未安装时导入失败
 
+_UNSET = object()
+# 环境变量中的全局输出上限；首次使用时读取一次（main() 中 load_dotenv 晚于模块导入）
+_env_mct_cache: Any = _UNSET
+
+
+def _coerce_int(v) -> Optional[int]:
+    try:
+        return None if v is None else int(v)
+    except Exception:
+        return None
+
+
+def _read_mct_env() -> Optional[int]:
+    """从环境变量读取全局输出上限覆盖（ARK_MAX_COMPLETION_TOKENS 或 LLM_MAX_COMPLETION_TOKENS）"""
+    mct_env = (os.environ.get("ARK_MAX_COMPLETION_TOKENS") or os.environ.get("LLM_MAX_COMPLETION_TOKENS") or "").strip()
+    if not mct_env:
+        return None
+    try:
+        return max(0, int(mct_env))
+    except Exception:
+        return None
+
+
+def _env_mct() -> Optional[int]:
+    global _env_mct_cache
+    if _env_mct_cache is _UNSET:
+        _env_mct_cache = _read_mct_env()
+    return _env_mct_cache
+
+
+def _pick_mct(max_completion_tokens, max_tokens, default: int) -> Tuple[int, str]:
+    """规范化与优先级：显式参数 > 调用方的 max_tokens(非默认) > 环境变量 > 默认值
+
+    Returns:
+        (最终使用的上限, 来源说明)
+    """
+    explicit_mct = _coerce_int(max_completion_tokens)
+    if explicit_mct is not None:
+        return max(1, explicit_mct), "explicit_max_completion_tokens"
+    caller_max_tokens = _coerce_int(max_tokens)
+    if caller_max_tokens is not None and caller_max_tokens != default:
+        return max(1, caller_max_tokens), "caller_max_tokens"
+    env_mct = _env_mct()
+    if env_mct is not None:
+        return max(1, env_mct), "env_max_completion_tokens"
+    return default, "default"
+
+
+# 战术分配系统提示词的固定部分（兵种克制内容在末尾追加）
+_SYSTEM_PROMPT_PREFIX = "\n".join([
+    "你是一个OpenRA战术分配专家。你的任务是：根据我方作战单位与敌方所有单位的实时坐标与类型，生成逐单位的攻击目标分配。",
+    "严格输出要求：只能返回JSON字符串，不要加入任何额外文字、解释或Markdown标记。",
+    "输出格式（唯一合法）：必须返回{\"pairs\": [[attacker_id, target_id], ...]}，且仅此一种格式；不得使用其他键名、不得输出分组/对象数组/多余字段。",
+    "注意：pairs 必须是二维整数数组；允许多个 attacker_id 指向同一 target_id 以实现集火。",
+    "策略：优先基于兵种克制关系，并结合作战规则（优先/就近/集火/穿插/避让）。",
+    "兵种克制与规则：",
+]) + "\n"
+
+
+def _preview(text: Any, n: int = 200) -> str:
+    return str(text)[:n].replace("\n", " ")
+
 
 class DoubaoClient:
     def __init__(self, api_key: Optional[str] = None, model: Optional[str] = None, timeout: Optional[int] = None):
@@ -56,47 +119,19 @@ class DoubaoClient:
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_prompt}
         ]
-        # 从环境变量读取全局输出上限覆盖（ARK_MAX_COMPLETION_TOKENS 或 LLM_MAX_COMPLETION_TOKENS）
-        mct_env = (os.environ.get("ARK_MAX_COMPLETION_TOKENS") or os.environ.get("LLM_MAX_COMPLETION_TOKENS") or "").strip()
-        env_max_completion_tokens: Optional[int] = None
-        if mct_env:
-            try:
-                env_max_completion_tokens = max(0, int(mct_env))
-            except Exception:
-                env_max_completion_tokens = None
-
-        # 规范化与优先级：显式参数 > 调用方的 max_tokens(非默认) > 环境变量 > 默认值
-        def _coerce_int(v) -> Optional[int]:
-            try:
-                return None if v is None else int(v)
-            except Exception:
-                return None
-        explicit_mct = _coerce_int(max_completion_tokens)
-        caller_max_tokens = _coerce_int(max_tokens)
-        chosen_source = ""
-        if explicit_mct is not None:
-            use_max_completion_tokens = max(1, explicit_mct)
-            chosen_source = "explicit_max_completion_tokens"
-        elif caller_max_tokens is not None and caller_max_tokens != DEFAULT_MAX_TOKENS:
-            use_max_completion_tokens = max(1, caller_max_tokens)
-            chosen_source = "caller_max_tokens"
-        elif env_max_completion_tokens is not None:
-            use_max_completion_tokens = max(1, env_max_completion_tokens)
-            chosen_source = "env_max_completion_tokens"
-        else:
-            use_max_completion_tokens = DEFAULT_MAX_TOKENS
-            chosen_source = "default"
+        use_max_completion_tokens, chosen_source = _pick_mct(max_completion_tokens, max_tokens, DEFAULT_MAX_TOKENS)
 
         # Debug 输入
-        self._log_debug(
-            f"chat_json start model={self.model} temp={temperature} max_completion_tokens={use_max_completion_tokens} (type={type(use_max_completion_tokens).__name__}, source={chosen_source}) timeout={self.timeout}s thinking={self.thinking}"
-        )
-        self._log_debug(
-            f"system_prompt len={len(system_prompt)} preview={system_prompt[:200].replace('\n',' ')}"
-        )
-        self._log_debug(
-            f"user_prompt len={len(user_prompt)} preview={user_prompt[:200].replace('\n',' ')}"
-        )
+        if self._debug_enabled():
+            self._log_debug(
+                f"chat_json start model={self.model} temp={temperature} max_completion_tokens={use_max_completion_tokens} (type={type(use_max_completion_tokens).__name__}, source={chosen_source}) timeout={self.timeout}s thinking={self.thinking}"
+            )
+            self._log_debug(
+                f"system_prompt len={len(system_prompt)} preview={_preview(system_prompt)}"
+            )
+            self._log_debug(
+                f"user_prompt len={len(user_prompt)} preview={_preview(user_prompt)}"
+            )
         t0 = time.time()
         try:
             # 组装参数：统一仅传 max_tokens（与官方示例一致），避免混用导致服务端报错
@@ -119,9 +154,10 @@ class DoubaoClient:
         content = ""
         try:
             content = resp.choices[0].message.content if resp and resp.choices else ""
-            self._log_debug(
-                f"chat_json done in {elapsed:.2f}s choices={len(resp.choices) if getattr(resp,'choices',None) else 0} content_len={len(content)} preview={str(content)[:200].replace('\n',' ')}"
-            )
+            if self._debug_enabled():
+                self._log_debug(
+                    f"chat_json done in {elapsed:.2f}s choices={len(resp.choices) if getattr(resp,'choices',None) else 0} content_len={len(content)} preview={_preview(content)}"
+                )
         except Exception as e:
             self._log_debug(f"chat_json parse response error: {type(e).__name__}: {e}")
             # 尝试打印响应对象的可用属性（避免大量输出）
@@ -131,13 +167,27 @@ class DoubaoClient:
             except Exception:
                 pass
             raise
-        # 强制剥离 Markdown 包裹
+        # 强制剥离 Markdown 包裹（只处理首尾围栏，保留JSON内部的反引号）
         content = str(content).strip()
         if content.startswith("```"):
-            content = content.strip('`')
-            content = content.replace("json\n", "", 1).strip()
+            content = content[3:]
+            if content[:4].lower() == "json":
+                content = content[4:].lstrip("\n")
+            if content.endswith("```"):
+                content = content[:-3]
+            content = content.strip()
         return content
 
+    async def chat_json_async(self, system_prompt: str, user_prompt: str, temperature: float = 0.2, max_tokens: int = 2048, max_completion_tokens: Optional[int] = None) -> str:
+        """
+        chat_json 的协程版本：在线程中执行同步请求，便于在事件循环中并发发起多个角色调用。
+        超时由 asyncio.wait_for 控制（略大于 SDK 自身超时）。
+        """
+        return await asyncio.wait_for(
+            asyncio.to_thread(self.chat_json, system_prompt, user_prompt, temperature, max_tokens, max_completion_tokens),
+            timeout=float(self.timeout or 45) + 5.0,
+        )
+
     @staticmethod
     def build_system_prompt(unit_mapping_text: str, counters_placeholder: str = "{{UNIT_TYPE_COUNTERS}}") -> str:
         """
@@ -146,16 +196,7 @@ class DoubaoClient:
         - 不再注入中文-英文单位映射，仅使用英文代码。
         - 动态注入兵种克制内容：counters_placeholder
         """
-        lines = [
-            "你是一个OpenRA战术分配专家。你的任务是：根据我方作战单位与敌方所有单位的实时坐标与类型，生成逐单位的攻击目标分配。",
-            "严格输出要求：只能返回JSON字符串，不要加入任何额外文字、解释或Markdown标记。",
-            "输出格式（唯一合法）：必须返回{\"pairs\": [[attacker_id, target_id], ...]}，且仅此一种格式；不得使用其他键名、不得输出分组/对象数组/多余字段。",
-            "注意：pairs 必须是二维整数数组；允许多个 attacker_id 指向同一 target_id 以实现集火。",
-            "策略：优先基于兵种克制关系，并结合作战规则（优先/就近/集火/穿插/避让）。",
-            "兵种克制与规则：",
-            counters_placeholder,
-        ]
-        return "\n".join(lines)
+        return _SYSTEM_PROMPT_PREFIX + counters_placeholder
 
     @staticmethod 
     def get_unit_mapping_text(unit_mapper) -> str:
@@ -202,35 +243,7 @@ class DoubaoClient:
         
         # 使用与 chat_json 相同的 token 限制逻辑
         DEFAULT_MAX_TOKENS = 16384  # 流式输出默认更大
-        mct_env = (os.environ.get("ARK_MAX_COMPLETION_TOKENS") or os.environ.get("LLM_MAX_COMPLETION_TOKENS") or "").strip()
-        env_max_completion_tokens: Optional[int] = None
-        if mct_env:
-            try:
-                env_max_completion_tokens = max(0, int(mct_env))
-            except Exception:
-                env_max_completion_tokens = None
-
-        def _coerce_int(v) -> Optional[int]:
-            try:
-                return None if v is None else int(v)
-            except Exception:
-                return None
-        
-        explicit_mct = _coerce_int(max_completion_tokens)
-        caller_max_tokens = _coerce_int(max_tokens)
-        chosen_source = ""
-        if explicit_mct is not None:
-            use_max_completion_tokens = max(1, explicit_mct)
-            chosen_source = "explicit_max_completion_tokens"
-        elif caller_max_tokens is not None and caller_max_tokens != DEFAULT_MAX_TOKENS:
-            use_max_completion_tokens = max(1, caller_max_tokens)
-            chosen_source = "caller_max_tokens"
-        elif env_max_completion_tokens is not None:
-            use_max_completion_tokens = max(1, env_max_completion_tokens)
-            chosen_source = "env_max_completion_tokens"
-        else:
-            use_max_completion_tokens = DEFAULT_MAX_TOKENS
-            chosen_source = "default"
+        use_max_completion_tokens, chosen_source = _pick_mct(max_completion_tokens, max_tokens, DEFAULT_MAX_TOKENS)
 
         # Debug 输入
         self._log_debug(
@@ -5,61 +5,82 @@
 - 获取敌方所有单位（包括作战单位、建筑、防御、矿车、MCV）
 - 转换为LLM友好的JSON格式
 """
-from typing import List, Dict, Any
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
 from .api_client import GameAPIClient, TargetsQueryParam, Actor
 from .unit_mapping import UnitMapper
+from . import json_utils
+
+# 己方非作战单位代码（小写判定）
+_NON_COMBAT_CODES = frozenset({
+    # 建筑
+    "fact", "power", "barr", "proc", "weap", "dome", "apwr", "fix", "afld",
+    "stek", "tent", "kenn", "hpad", "spen", "syrd", "atek",
+    # 防御
+    "ftur", "tsla", "sam", "silo", "gun", "agun", "pbox", "hbox", "gap", "iron", "pdox", "mslo",
+    # 非作战单位
+    "harv",    # 矿车
+    "mcv",     # 基地车
+    "mpspawn", # 出生点（不可攻击）
+    "camera"   # 摄像机/无关实体
+})
+
+# 敌方需要排除的出生点与无关实体
+_SPAWN_CAMERA = frozenset({"mpspawn", "camera"})
+
+# 并发查询用线程池（首次使用时创建）
+_QUERY_POOL: Optional[ThreadPoolExecutor] = None
+_QUERY_POOL_LOCK = threading.Lock()
+
+
+def _extract(actors: List[Actor], unit_mapper: UnitMapper, code_cache: Dict[Any, Tuple[Any, str]], skip: frozenset) -> List[Dict[str, Any]]:
+    """将 Actor 列表转换为 LLM 友好的字典列表，跳过代码（小写）在 skip 中的单位"""
+    items = []
+    for actor in actors:
+        pos = actor.position
+        if not pos:
+            continue
+            
+        # 获取单位英文代码（同类型只解析一次）
+        atype = actor.type
+        pair = code_cache.get(atype)
+        if pair is None:
+            unit_code = unit_mapper.get_code(atype) or atype
+            pair = (unit_code, unit_code.lower() if isinstance(unit_code, str) else str(unit_code).lower())
+            code_cache[atype] = pair
+        unit_code, unit_code_l = pair
+        
+        # 大小写不敏感过滤
+        if unit_code_l in skip:
+            continue
+        
+        item = {
+            "id": actor.actor_id,
+            "type": unit_code,  # 使用英文代码
+            "x": pos.x,
+            "y": pos.y
+        }
+        # 仅在可用时提供血量信息，避免误判
+        hp = actor.hp
+        if hp is not None:
+            item["hp"] = hp
+        max_hp = actor.max_hp
+        if max_hp is not None:
+            item["maxHp"] = max_hp
+        
+        items.append(item)
+    return items
 
 
 def get_ally_combat_units(api_client: GameAPIClient, unit_mapper: UnitMapper) -> List[Dict[str, Any]]:
     """
     获取己方作战单位列表（排除建筑、防御、矿车、MCV）
-    返回格式: [{"id": int, "type": str, "x": int, "y": int}, ...]
+    返回格式: [{"id": int, "type": str, "x": int, "y": int, "hp"?: int, "maxHp"?: int}, ...]
     """
     try:
-        # 查询己方所有单位
         all_allies = api_client.query_actor(TargetsQueryParam(faction="己方"))
-        
-        # 定义非作战单位集合（使用小写做判定）
-        non_combat_codes = {
-            # 建筑
-            "fact", "power", "barr", "proc", "weap", "dome", "apwr", "fix", "afld", 
-            "stek", "tent", "kenn", "hpad", "spen", "syrd", "atek",
-            # 防御
-            "ftur", "tsla", "sam", "silo", "gun", "agun", "pbox", "hbox", "gap", "iron", "pdox", "mslo",
-            # 非作战单位
-            "harv",    # 矿车
-            "mcv",     # 基地车
-            "mpspawn", # 出生点（不可攻击）
-            "camera"    # 摄像机/无关实体
-        }
-        
-        combat_units = []
-        for actor in all_allies:
-            if not actor.position:
-                continue
-                
-            # 获取单位英文代码
-            unit_code = unit_mapper.get_code(actor.type) or actor.type
-            unit_code_l = str(unit_code).lower()
-            
-            # 过滤掉非作战单位（含 camera），大小写不敏感
-            if unit_code_l not in non_combat_codes:
-                item = {
-                    "id": actor.actor_id,
-                    "type": unit_code,
-                    "x": actor.position.x,
-                    "y": actor.position.y
-                }
-                try:
-                    if getattr(actor, 'hp', None) is not None:
-                        item["hp"] = actor.hp
-                    if getattr(actor, 'max_hp', None) is not None:
-                        item["maxHp"] = actor.max_hp
-                except Exception:
-                    pass
-                combat_units.append(item)
-        
-        return combat_units
+        return _extract(all_allies, unit_mapper, {}, _NON_COMBAT_CODES)
     except Exception:
         return []
 
@@ -70,41 +91,46 @@ def get_enemy_all_units(api_client: GameAPIClient, unit_mapper: UnitMapper) -> L
     返回格式: [{"id": int, "type": str, "x": int, "y": int, "hp"?: int, "maxHp"?: int}, ...]
     """
     try:
-        # 查询敌方所有单位
         all_enemies = api_client.query_actor(TargetsQueryParam(faction="敌方"))
-        
-        enemy_units = []
-        for actor in all_enemies:
-            if not actor.position:
-                continue
-                
-            # 获取单位英文代码
-            unit_code = unit_mapper.get_code(actor.type) or actor.type
-            unit_code_l = str(unit_code).lower()
-            
-            # 过滤掉出生点和无关实体（camera），大小写不敏感
-            if unit_code_l in ("mpspawn", "camera"):
-                continue
-            
-            item = {
-                "id": actor.actor_id,
-                "type": unit_code,  # 使用英文代码
-                "x": actor.position.x,
-                "y": actor.position.y
-            }
-            # 仅在可用时提供血量信息，避免误判
-            if actor.hp is not None:
-                item["hp"] = actor.hp
-            if actor.max_hp is not None:
-                item["maxHp"] = actor.max_hp
-            
-            enemy_units.append(item)
-        
-        return enemy_units
+        return _extract(all_enemies, unit_mapper, {}, _SPAWN_CAMERA)
     except Exception:
         return []
 
 
+def _query_pool() -> ThreadPoolExecutor:
+    global _QUERY_POOL
+    with _QUERY_POOL_LOCK:
+        if _QUERY_POOL is None:
+            _QUERY_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="GameDataQuery")
+        return _QUERY_POOL
+
+
+def get_battlefield_snapshot(api_client: GameAPIClient, unit_mapper: UnitMapper) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """
+    一次取回双方单位：(己方作战单位, 敌方所有单位)
+    敌方查询在线程池中与己方查询并发进行，两侧共用单位代码缓存；任一侧失败时该侧返回空列表。
+    """
+    try:
+        enemy_future = _query_pool().submit(api_client.query_actor, TargetsQueryParam(faction="敌方"))
+    except Exception:
+        enemy_future = None
+    code_cache: Dict[Any, Tuple[Any, str]] = {}
+    try:
+        all_allies = api_client.query_actor(TargetsQueryParam(faction="己方"))
+        allies = _extract(all_allies, unit_mapper, code_cache, _NON_COMBAT_CODES)
+    except Exception:
+        allies = []
+    try:
+        if enemy_future is not None:
+            all_enemies = enemy_future.result()
+        else:
+            all_enemies = api_client.query_actor(TargetsQueryParam(faction="敌方"))
+        enemies = _extract(all_enemies, unit_mapper, code_cache, _SPAWN_CAMERA)
+    except Exception:
+        enemies = []
+    return allies, enemies
+
+
 def build_llm_prompt_data(ally_units: List[Dict[str, Any]], enemy_units: List[Dict[str, Any]]) -> str:
     """
     构建LLM输入数据字符串
@@ -114,6 +140,4 @@ def build_llm_prompt_data(ally_units: List[Dict[str, Any]], enemy_units: List[Di
         "ally_combat_units": ally_units,
         "enemy_all_units": enemy_units
     }
-    
-    import json
-    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+    return json_utils.dumps(data)
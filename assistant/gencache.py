@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+结构化提示词的程序化复用缓存（GenCache）
+- 将提示词中的独立数字（ID/坐标/血量等）替换为占位符得到“模板”，模板相同视为结构相同
+- 同一模板下，新旧提示词的数字按出现位置一一对应，得到 旧值 -> 新值 的改写表
+- 单位ID另按调用方给出的顺序一一对应（避免与同值坐标混淆）
+- 新旧提示词涉及的单位ID重合度达到阈值时，调用方可用改写表把缓存的回答改写为新回答，跳过一次LLM调用
+"""
+import copy
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# 独立数字：不与字母/数字/下划线相连（避免改动 brigade_1_company2 这类名称）
+_NUM_RE = re.compile(r"(?<![A-Za-z0-9_.])-?\d+(?:\.\d+)?(?![A-Za-z0-9_])")
+
+
+def templatize(prompt: str) -> Tuple[bytes, List[str]]:
+    """返回 (模板摘要, 按出现顺序的数字文本列表)"""
+    text = str(prompt)
+    nums = _NUM_RE.findall(text)
+    digest = hashlib.blake2b(_NUM_RE.sub("#", text).encode("utf-8"), digest_size=16).digest()
+    return digest, nums
+
+
+class GenCacheHit:
+    """一次命中：缓存的回答副本、数字改写表与单位ID改写表"""
+    __slots__ = ("response", "_mapping", "_ambiguous", "_id_map")
+
+    def __init__(self, response: Any, mapping: Dict[str, str], ambiguous: frozenset, id_map: Dict[int, int]):
+        self.response = response
+        self._mapping = mapping
+        self._ambiguous = ambiguous
+        self._id_map = id_map
+
+    def map_id(self, value: Any) -> Optional[int]:
+        """把旧回答中的单位ID改写为新提示词中同一位置的单位ID"""
+        return self._id_map.get(value)
+
+    def map_int(self, value: Any) -> Optional[int]:
+        """把旧回答中的整数改写为新提示词中对应位置的值；无法唯一确定时返回 None"""
+        key = str(value)
+        if key in self._ambiguous:
+            return None
+        new = self._mapping.get(key)
+        if new is None:
+            return None
+        try:
+            return int(new)
+        except Exception:
+            return None
+
+
+class GenCache:
+    def __init__(self, maxsize: int = 128, min_overlap: float = 0.8):
+        self.maxsize = maxsize
+        self.min_overlap = min_overlap
+        self._entries: "OrderedDict[bytes, Tuple[List[str], Tuple[int, ...], Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def lookup(self, prompt: str, ids: Iterable[int]) -> Optional[GenCacheHit]:
+        """ids 须按提示词中的出现顺序给出，与 store 时一致"""
+        key, nums = templatize(prompt)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+        old_nums, old_ids, response = entry
+        new_ids = tuple(ids)
+        old_set, new_set = set(old_ids), set(new_ids)
+        denom = max(len(old_set), len(new_set))
+        if denom and len(old_set & new_set) / denom < self.min_overlap:
+            return None
+        id_map = dict(zip(old_ids, new_ids)) if len(old_ids) == len(new_ids) else {}
+        # 模板相同则数字个数一致；同一旧值对应多个不同新值时视为歧义
+        mapping: Dict[str, str] = {}
+        ambiguous = set()
+        for old, new in zip(old_nums, nums):
+            prev = mapping.setdefault(old, new)
+            if prev != new:
+                ambiguous.add(old)
+        return GenCacheHit(copy.deepcopy(response), mapping, frozenset(ambiguous), id_map)
+
+    def store(self, prompt: str, ids: Iterable[int], response: Any) -> None:
+        key, nums = templatize(prompt)
+        value = (nums, tuple(ids), copy.deepcopy(response))
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""
+JSON 编解码封装
+- 优先使用 orjson（C 实现，直接输出 UTF-8）；未安装时回退到标准库 json
+- dumps 统一输出紧凑格式且不转义中文，两种后端得到的文本一致
+- canonical 按键排序输出 UTF-8 字节，同一对象的结果稳定，可用作缓存键/签名
+"""
+import json
+from typing import Any
+
+try:
+    import orjson
+except ImportError:  # 可选依赖，缺失时使用标准库
+    orjson = None
+
+
+def _default(obj: Any) -> Any:
+    # 兼容提供 to_dict() 的轻量数据对象
+    to_dict = getattr(obj, "to_dict", None)
+    if callable(to_dict):
+        return to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def _canonical_default(obj: Any) -> Any:
+    # 规范化只求稳定：无法序列化的对象退化为其字符串形式
+    to_dict = getattr(obj, "to_dict", None)
+    if callable(to_dict):
+        return to_dict()
+    return str(obj)
+
+
+if orjson is not None:
+    _ORJSON_OPTS = orjson.OPT_NON_STR_KEYS
+    _ORJSON_CANONICAL_OPTS = orjson.OPT_NON_STR_KEYS | orjson.OPT_SORT_KEYS
+
+    def dumps(obj: Any, sort_keys: bool = False) -> str:
+        """序列化为紧凑JSON字符串（不转义中文）；sort_keys=True 时按键排序"""
+        opts = _ORJSON_CANONICAL_OPTS if sort_keys else _ORJSON_OPTS
+        return orjson.dumps(obj, default=_default, option=opts).decode("utf-8")
+
+    def canonical(obj: Any) -> bytes:
+        """按键排序的紧凑JSON字节（用于缓存键/签名）"""
+        return orjson.dumps(obj, default=_canonical_default, option=_ORJSON_CANONICAL_OPTS)
+
+    def loads(s: Any) -> Any:
+        """解析JSON字符串/字节"""
+        return orjson.loads(s)
+else:
+    _ENCODER = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), default=_default)
+    _CANONICAL_ENCODER = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), sort_keys=True, default=_canonical_default)
+    _SORTED_ENCODER = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), sort_keys=True, default=_default)
+
+    def dumps(obj: Any, sort_keys: bool = False) -> str:
+        """序列化为紧凑JSON字符串（不转义中文）；sort_keys=True 时按键排序"""
+        return (_SORTED_ENCODER if sort_keys else _ENCODER).encode(obj)
+
+    def canonical(obj: Any) -> bytes:
+        """按键排序的紧凑JSON字节（用于缓存键/签名）"""
+        return _CANONICAL_ENCODER.encode(obj).encode("utf-8")
+
+    def loads(s: Any) -> Any:
+        """解析JSON字符串/字节"""
+        return json.loads(s)
+
+
+def safe_dumps(obj: Any, fallback: str, sort_keys: bool = False) -> str:
+    """序列化失败时返回 fallback（提示词各数据段共用，失败不影响其余段落）"""
+    try:
+        return dumps(obj, sort_keys)
+    except Exception:
+        return fallback
@@ -1,30 +1,160 @@
-import json
+import asyncio
+import copy
+import functools
+import hashlib
+import os
+import re
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
 from typing import Dict, Any, List, Optional, Tuple
 
+from . import json_utils
 from .doubao_client import DoubaoClient
+from .gencache import GenCache
 from .api_client import GameAPIClient, TargetsQueryParam, Location
 from .prompts.secretary import build_system_prompt as build_secretary_system_prompt
-from .prompts.logistics import build_system_prompt as build_logistics_system_prompt
-from .prompts.brigade import build_dispatch_prompt as build_brigade_dispatch_prompt
-from .prompts.company_attack import build_system_prompt as build_company_attack_prompt
+from .prompts.logistics import build_static_prompt as build_logistics_static_prompt, build_user_prompt as build_logistics_user_prompt
+from .prompts.brigade import build_static_prompt as build_brigade_static_prompt, build_user_prompt as build_brigade_user_prompt
+from .prompts.company_attack import build_static_prompt as build_company_attack_static_prompt, build_user_prompt as build_company_attack_user_prompt
 from .prompts.recruitment import build_system_prompt as build_recruitment_system_prompt
 
+# 调试输出中需要回显的提示词行（按角色）
+_SECRETARY_PROMPT_LINES_RE = re.compile(r"^.*(?:敌方基地坐标：|地图特殊点位\(JSON\)：).*$", re.M)
+_BRIGADE_PROMPT_LINES_RE = re.compile(r"^.*(?:地图特殊点位\(JSON\)：|敌方基地坐标|连队中心点\(JSON\)：|旅长辖区中心点坐标：).*$", re.M)
+
+# 执行阶段的游戏API调用彼此独立，共用一个线程池并发下发（惰性创建）
+_EXEC_POOL: Optional[ThreadPoolExecutor] = None
+_EXEC_POOL_LOCK = threading.Lock()
+_DISPATCH_TIMEOUT = 15.0
+
+
+def _text_digest(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+
+# 固定 system 提示词（旅长/后勤）只有少数几份：按字符串缓存摘要；秘书/招募的 system 随实时数据变化，逐次计算
+_static_text_digest = functools.lru_cache(maxsize=8)(_text_digest)
+
+
+def _exec_pool() -> ThreadPoolExecutor:
+    global _EXEC_POOL
+    with _EXEC_POOL_LOCK:
+        if _EXEC_POOL is None:
+            _EXEC_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="LLMExec")
+        return _EXEC_POOL
+
+
+def _llm_debug_enabled() -> bool:
+    # 与 DoubaoClient 一致：LLM_DEBUG 可在运行中由界面切换，每次调用时读取
+    return str(os.environ.get("LLM_DEBUG", "")).strip().lower() in ("1", "true", "yes", "on")
+
+
+def _print_prompt_lines(tag: str, pattern: "re.Pattern", prompt: str) -> None:
+    # 合并为一次 print，减少 stdout 写入次数
+    lines = [f"[LLM_PROMPT_LINE][{tag}] {m.group(0)}" for m in pattern.finditer(str(prompt))]
+    if lines:
+        print("\n".join(lines))
+
+
+def _zone_ids(items: Any) -> List[int]:
+    # 作战区单位可能是字典或带 id 属性的数据对象
+    out: List[int] = []
+    for u in items or []:
+        uid = u.get("id") if isinstance(u, dict) else getattr(u, "id", None)
+        if isinstance(uid, int):
+            out.append(uid)
+    return out
+
 
 class LLMRole:
+    # 各角色共享的精确匹配缓存：提示词摘要 -> 解析后的JSON（LRU）
+    _CALL_CACHE: "OrderedDict[bytes, Any]" = OrderedDict()
+    _CALL_CACHE_SIZE = 256
+    _CALL_CACHE_LOCK = threading.Lock()
+    # 高于该温度的调用结果不具备可复用性，不缓存
+    _CACHE_MAX_TEMPERATURE = 0.1
+
     def __init__(self, client: DoubaoClient):
         self.client = client
 
-    def call_json(self, system_prompt: str, user_prompt: str, max_tokens: int = 1024) -> Dict[str, Any]:
+    @classmethod
+    def cache_clear(cls) -> None:
+        with cls._CALL_CACHE_LOCK:
+            cls._CALL_CACHE.clear()
+
+    def _cache_key(self, system_prompt: str, user_prompt: str, max_tokens: int, static_system: bool = False) -> bytes:
+        model = str(getattr(self.client, 'model', '') or '')
+        digest = _static_text_digest if static_system else _text_digest
+        h = hashlib.blake2b(digest(system_prompt), digest_size=16)
+        h.update("\x00".join((model, user_prompt, str(max_tokens))).encode("utf-8"))
+        return h.digest()
+
+    @classmethod
+    def _cache_get(cls, key: bytes) -> Any:
+        with cls._CALL_CACHE_LOCK:
+            hit = cls._CALL_CACHE.get(key)
+            if hit is None:
+                return None
+            cls._CALL_CACHE.move_to_end(key)
+        return copy.deepcopy(hit)
+
+    @classmethod
+    def _cache_put(cls, key: bytes, value: Any) -> None:
+        value = copy.deepcopy(value)
+        with cls._CALL_CACHE_LOCK:
+            cls._CALL_CACHE[key] = value
+            cls._CALL_CACHE.move_to_end(key)
+            while len(cls._CALL_CACHE) > cls._CALL_CACHE_SIZE:
+                cls._CALL_CACHE.popitem(last=False)
+
+    def _cache_probe(self, system_prompt: str, user_prompt: str, max_tokens: int, temperature: float, static_system: bool = False) -> Tuple[Optional[bytes], Any]:
+        """返回 (缓存键, 命中结果)；温度过高不参与缓存时键为 None"""
+        if temperature > self._CACHE_MAX_TEMPERATURE:
+            return None, None
+        key = self._cache_key(system_prompt, user_prompt, max_tokens, static_system)
+        return key, self._cache_get(key)
+
+    def _parse_and_store(self, key: Optional[bytes], out: Any) -> Dict[str, Any]:
+        try:
+            res = json_utils.loads(out)
+        except Exception:
+            return {}
+        # 仅缓存成功解析出的非空结果
+        if key is not None and res:
+            self._cache_put(key, res)
+        return res
+
+    def call_json(self, system_prompt: str, user_prompt: str, max_tokens: int = 1024, temperature: float = 0.1, static_system: bool = False) -> Dict[str, Any]:
+        """static_system=True 表示 system 为固定提示词，其摘要可按字符串缓存"""
         if self.client is None:
             return {}
+        key, hit = self._cache_probe(system_prompt, user_prompt, max_tokens, temperature, static_system)
+        if hit is not None:
+            return hit
         try:
-            out = self.client.chat_json(system_prompt=system_prompt, user_prompt=user_prompt, temperature=0.1, max_tokens=max_tokens)
-            try:
-                return json.loads(out)
-            except Exception:
-                return {}
+            out = self.client.chat_json(system_prompt=system_prompt, user_prompt=user_prompt, temperature=temperature, max_tokens=max_tokens)
         except Exception as e:
             return {}
+        return self._parse_and_store(key, out)
+
+    async def call_json_async(self, system_prompt: str, user_prompt: str, max_tokens: int = 1024, temperature: float = 0.1, static_system: bool = False) -> Dict[str, Any]:
+        """call_json 的协程版本，供多个角色在同一事件循环中并发调用"""
+        if self.client is None:
+            return {}
+        key, hit = self._cache_probe(system_prompt, user_prompt, max_tokens, temperature, static_system)
+        if hit is not None:
+            return hit
+        try:
+            chat_async = getattr(self.client, 'chat_json_async', None)
+            if chat_async is not None:
+                out = await chat_async(system_prompt=system_prompt, user_prompt=user_prompt, temperature=temperature, max_tokens=max_tokens)
+            else:
+                out = await asyncio.to_thread(self.client.chat_json, system_prompt=system_prompt, user_prompt=user_prompt, temperature=temperature, max_tokens=max_tokens)
+        except Exception:
+            return {}
+        return self._parse_and_store(key, out)
 
 
 class LLMSecretary(LLMRole):
@@ -32,23 +162,21 @@ class LLMSecretary(LLMRole):
         brigades_info = (context or {}).get("brigades_info") if isinstance(context, dict) else None
         battlefield = (context or {}).get("battlefield") if isinstance(context, dict) else None
         companies = (context or {}).get("companies") if isinstance(context, dict) else None
-        from .prompts.secretary import build_system_prompt as build_secretary_system_prompt
         system_prompt = build_secretary_system_prompt(text, brigades_info, battlefield, companies)
-        try:
-            lines = str(system_prompt).splitlines()
-            for ln in lines:
-                if ("敌方基地坐标：" in ln) or ("地图特殊点位(JSON)：" in ln):
-                    print(f"[LLM_PROMPT_LINE][Secretary] {ln}")
-        except Exception:
-            pass
+        debug = _llm_debug_enabled()
+        if debug:
+            try:
+                _print_prompt_lines("Secretary", _SECRETARY_PROMPT_LINES_RE, system_prompt)
+            except Exception:
+                pass
         user_prompt = str(text or "开始")
         res = self.call_json(system_prompt, user_prompt, max_tokens=2048) or {}
+        if debug:
+            try:
+                print(f"[LLM_JSON][Secretary] {json_utils.dumps(res)}")
+            except Exception:
+                pass
         try:
-            print(f"[LLM_JSON][Secretary] {json.dumps(res, ensure_ascii=False)}")
-        except Exception:
-            pass
-        try:
-            from .command_parser import CommandParser  # type: ignore
             cp = getattr(self, 'command_parser', None)
             if cp:
                 setattr(cp, '_secretary_report', res.get('report'))
@@ -57,191 +185,359 @@ class LLMSecretary(LLMRole):
         return res
 
 
+# 后勤执行：受理的工具类型、不由后勤生产的单位（防御建筑与矿车）
+_PRODUCE_TYPES = frozenset(("produce", "build"))
+_SKIP_UNITS = frozenset(("ftur", "tsla", "sam", "harv"))
+# 各队列的数量下限/上限（None 表示不设上限），未列出的队列数量原样下发
+_QTY_CLAMP = {"Vehicle": (2, 5), "Infantry": (5, None)}
+
+
 class LLMLogistics(LLMRole):
     def plan(self, battlefield: Dict[str, Any], task_directive: Optional[Dict[str, Any]] = None, recruitment_advisory: Optional[Dict[str, Any]] = None, recent_decisions: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
-        system_prompt = build_logistics_system_prompt(battlefield, task_directive, recruitment_advisory, recent_decisions)
-        user_prompt = "开始"
-        return self.call_json(system_prompt, user_prompt, max_tokens=4096)
+        # 固定规则作为 system，实时数据作为 user，system 跨调用保持不变
+        system_prompt = build_logistics_static_prompt()
+        user_prompt = build_logistics_user_prompt(battlefield, task_directive, recruitment_advisory, recent_decisions)
+        return self.call_json(system_prompt, user_prompt, max_tokens=4096, static_system=True)
 
     def execute(self, api: GameAPIClient, plan: Dict[str, Any]) -> str:
         tools = plan.get("tools") or []
         results: List[str] = []
+        append = results.append
+        clamp_get = _QTY_CLAMP.get
         for t in tools:
             if not isinstance(t, dict):
                 continue
-            ttype = str(t.get("type") or "").lower()
-            unit = t.get("unit")
-            qty = int(t.get("quantity") or 1)
-            queue = t.get("queue") or "Building"
+            get = t.get
+            ttype = str(get("type") or "").lower()
+            unit = get("unit")
+            qty = int(get("quantity") or 1)
+            queue = get("queue") or "Building"
             try:
-                if ttype in {"produce", "build"}:
+                if ttype in _PRODUCE_TYPES:
                     ql = str(queue).strip()
-                    ul = str(unit or "").strip().lower()
-                    if ql == "Defense" or ul in {"ftur","tsla","sam","harv"}:
-                        results.append("skip defense")
+                    if ql == "Defense" or str(unit or "").strip().lower() in _SKIP_UNITS:
+                        append("skip defense")
                         continue
-                    if ql == "Vehicle":
-                        qty = max(2, min(qty, 5))
-                    elif ql == "Infantry":
-                        qty = max(5, qty)
+                    bounds = clamp_get(ql)
+                    if bounds is not None:
+                        lo, hi = bounds
+                        qty = max(lo, qty if hi is None else min(qty, hi))
                     ok, _ = api.produce_unit(unit, qty, queue)
                     if ok:
-                        results.append(f"{ttype} {qty} {unit}")
+                        append(f"{ttype} {qty} {unit}")
                     else:
-                        results.append(f"fail {unit}")
+                        append(f"fail {unit}")
                 else:
-                    results.append(f"skip {ttype}")
+                    append(f"skip {ttype}")
             except Exception:
-                results.append(f"error {unit}")
+                append(f"error {unit}")
         return ", ".join(results) if results else "no tools"
 
 
 class LLMBrigadeCommander(LLMRole):
-    def plan_dispatch(self, zone: Dict[str, Any], mission: str, allowed_companies: List[str]) -> Dict[str, Any]:
-        system_prompt = build_brigade_dispatch_prompt(zone, mission, allowed_companies)
-        try:
-            lines = str(system_prompt).splitlines()
-            for ln in lines:
-                if ("地图特殊点位(JSON)：" in ln) or ("敌方基地坐标" in ln) or ("连队中心点(JSON)：" in ln) or ("旅长辖区中心点坐标：" in ln):
-                    print(f"[LLM_PROMPT_LINE][Brigade] {ln}")
-        except Exception:
-            pass
-        user_prompt = "开始"
-        res = self.call_json(system_prompt, user_prompt, max_tokens=4096) or {}
+    # 结构相同的派遣提示词：改写上次回答中的坐标后直接复用
+    _GENCACHE = GenCache()
+
+    @staticmethod
+    def _dispatch_ids(zone: Dict[str, Any]) -> List[int]:
+        ids = _zone_ids((zone or {}).get("enemies"))
+        for unit_ids in ((zone or {}).get("company_units") or {}).values():
+            ids.extend(i for i in unit_ids or [] if isinstance(i, int))
+        return ids
+
+    def _gencache_dispatch(self, prompt: str, zone: Dict[str, Any], allowed_companies: List[str]) -> Optional[Dict[str, Any]]:
+        hit = self._GENCACHE.lookup(prompt, self._dispatch_ids(zone))
+        if hit is None:
+            return None
+        res = hit.response
+        allowed = set(allowed_companies or [])
+        # 所有坐标都必须能唯一对应到新提示词中的数值，且连队仍可调用，否则放弃复用
+        for key in ("dispatch", "tools"):
+            for item in res.get(key) or []:
+                if not isinstance(item, dict):
+                    return None
+                if key == "dispatch" and item.get("company") not in allowed:
+                    return None
+                loc = item.get("location")
+                if isinstance(loc, dict):
+                    x, y = hit.map_int(loc.get("x")), hit.map_int(loc.get("y"))
+                    if x is None or y is None:
+                        return None
+                    loc["x"], loc["y"] = x, y
+        return res
+
+    def _dispatch_prelude(self, zone: Dict[str, Any], mission: str, allowed_companies: List[str]) -> Tuple[str, str, bool, Optional[Dict[str, Any]]]:
+        # 固定说明作为 system，上级任务与辖区数据作为 user
+        system_prompt = build_brigade_static_prompt()
+        user_prompt = build_brigade_user_prompt(zone, mission, allowed_companies)
+        debug = _llm_debug_enabled()
+        if debug:
+            try:
+                _print_prompt_lines("Brigade", _BRIGADE_PROMPT_LINES_RE, user_prompt)
+            except Exception:
+                pass
         try:
-            print(f"[LLM_JSON][Brigade] {json.dumps(res, ensure_ascii=False)}")
+            cached = self._gencache_dispatch(system_prompt + "\n" + user_prompt, zone, allowed_companies)
         except Exception:
-            pass
+            cached = None
+        if cached is not None and debug:
+            print(f"[LLM_JSON][Brigade][GenCache] {json_utils.dumps(cached)}")
+        return system_prompt, user_prompt, debug, cached
+
+    def _dispatch_finish(self, system_prompt: str, user_prompt: str, zone: Dict[str, Any], res: Dict[str, Any], debug: bool) -> Dict[str, Any]:
+        if isinstance(res, dict) and res.get("dispatch"):
+            self._GENCACHE.store(system_prompt + "\n" + user_prompt, self._dispatch_ids(zone), res)
+        if debug:
+            try:
+                print(f"[LLM_JSON][Brigade] {json_utils.dumps(res)}")
+            except Exception:
+                pass
         return res
 
+    def plan_dispatch(self, zone: Dict[str, Any], mission: str, allowed_companies: List[str]) -> Dict[str, Any]:
+        system_prompt, user_prompt, debug, cached = self._dispatch_prelude(zone, mission, allowed_companies)
+        if cached is not None:
+            return cached
+        res = self.call_json(system_prompt, user_prompt, max_tokens=4096, static_system=True) or {}
+        return self._dispatch_finish(system_prompt, user_prompt, zone, res, debug)
+
+    async def plan_dispatch_async(self, zone: Dict[str, Any], mission: str, allowed_companies: List[str]) -> Dict[str, Any]:
+        system_prompt, user_prompt, debug, cached = self._dispatch_prelude(zone, mission, allowed_companies)
+        if cached is not None:
+            return cached
+        res = await self.call_json_async(system_prompt, user_prompt, max_tokens=4096, static_system=True) or {}
+        return self._dispatch_finish(system_prompt, user_prompt, zone, res, debug)
+
     def execute_dispatch(self, api: GameAPIClient, company_units: Dict[str, List[int]], dispatch: List[Dict[str, Any]]) -> Tuple[bool, str]:
         if not dispatch:
             return False, "empty"
-        ok_any = False
+        # 先汇总全部连队的单位ID（去重）一次查询，再按连队分组
+        moves: List[Tuple[List[int], Location]] = []
+        all_ids: Dict[int, None] = {}
         for d in dispatch:
+            if not isinstance(d, dict):
+                continue
+            ids = company_units.get(str(d.get("company") or "")) or []
+            if not ids:
+                continue
             try:
-                cname = str(d.get("company") or "")
                 loc = d.get("location") or {}
-                ids = company_units.get(cname) or []
-                if not ids:
-                    continue
-                actors = api.query_actor(TargetsQueryParam(actorId=ids))
-                api.move_units_by_location(actors, Location(int(loc.get("x", 0)), int(loc.get("y", 0))), attack_move=False, assault_move=False)
-                ok_any = True
+                target = Location(int(loc.get("x", 0)), int(loc.get("y", 0)))
             except Exception:
-                pass
+                continue
+            moves.append((ids, target))
+            all_ids.update(dict.fromkeys(ids))
+        if not moves:
+            return False, "dispatch"
+        try:
+            by_id = {a.actor_id: a for a in api.query_actor(TargetsQueryParam(actorId=list(all_ids)))}
+        except Exception:
+            return False, "dispatch"
+
+        def _one(ids: List[int], target: Location) -> bool:
+            try:
+                actors = [by_id[i] for i in ids if i in by_id]
+                api.move_units_by_location(actors, target, attack_move=False, assault_move=False)
+                return True
+            except Exception:
+                return False
+
+        # 各连队的移动指令互不依赖，并发下发
+        pool = _exec_pool()
+        futures = [pool.submit(_one, ids, target) for ids, target in moves]
+        done, _ = wait(futures, timeout=_DISPATCH_TIMEOUT)
+        ok_any = any(f.result() for f in done)
         return ok_any, "dispatch"
 
 
+# 兵种克制与作战规则（固定文本，导入时拼装一次并驻留，调用方只读共用）
+_COUNTERS_TEXT = sys.intern("\n".join([
+    "单位分类 (Category) 与代码 (Code) 对照表（所有阵营通用）：",
+    "- 重要目标: mcv (基地车)",
+    "- 步兵 (INF):",
+    "  * 炮灰 (INF_MEAT): e1",
+    "  * 反甲/防空 (INF_AT): e3",
+    "- 车辆 (VEHICLE):",
+    "  * 主战 (MBT): 2tnk, 3tnk, 4tnk, ctnk",
+    "  * 远程 (ARTY): v2rl, arty",
+    "  * 轻型/防空 (AFV): ftrk, jeep, 1tnk, apc",
+    "  * 后勤: harv (矿车)",
+    "- 防御 (DEFENSE):",
+    "  * 对空: sam, agun",
+    "  * 反步兵: ftur, pbox",
+    "  * 反坦克: tsla, gun",
+    "- 飞机 (AIRCRAFT): yak, mig, heli, mh60",
+    "- 建筑 (BUILDING): fact (建造厂), 其他 (weap, barr, pwr, dome, fix, proc...)",
+    "",
+    "全局核心规则：",
+    "1. **对空限制**：仅 e3, 4tnk, ftrk, heli, sam, agun 具有对空能力。严禁分配其他单位攻击飞机。",
+    "2. **斩首行动**：如果 mcv (基地车) 可见且在射程内，所有单位最高优先级攻击 mcv。",
+    "3. **威胁优先**：战斗单位/防御 > 建筑。拆建筑仅在无威胁时进行。",
+    "4. **建筑拆除**：优先拆除 fact (建造厂)，其他建筑归为最低优先级，不区分顺序。",
+    "",
+    "基于 UnitCategory 的兵种克制与优先攻击链：",
+    "- **INF_AT (e3)**: 优先攻击 -> MBT (主战坦克)。",
+    "- **INF_MEAT (e1)**: 优先攻击 -> INF_AT (e3)。(利用数量优势消耗高价值步兵)",
+    "- **MBT (2tnk/3tnk/ctnk)**: 优先攻击 -> ARTY (切后排) > MBT (对决) > AFV。",
+    "  * 战术建议：可分出少量 MBT 突袭敌方后排 ARTY，扰乱敌方阵型。",
+    "- **AFV (jeep/1tnk/apc)**: 优先攻击 -> ARTY (利用高机动偷袭) > INF/AFV。",
+    "- **AFV (ftrk)**: 优先攻击 -> AIRCRAFT (防空第一) > ARTY > INF/AFV。",
+    "- **ARTY (v2rl/arty)**: 优先攻击 -> 密集的 INF (AOE杀伤最大化) > ARTY (反炮兵) > DEFENSE (射程外拆塔)。",
+    "",
+    "通用决策建议（自主权）：",
+    "1. **综合决策**：请综合考虑兵种克制、敌方血量、距离、敌方密度和我方位置。",
+    "2. **多点开花**：避免将所有火力集中于一点，建议形成多个局部火力优势点。",
+    "3. **动态平衡**：在“优先击杀最近威胁”与“突袭高价值后排（如 ARTY/MCV）”之间寻找平衡。例如，用主力抗线的同时，分兵骚扰敌方后排。",
+]))
+
+
+# 流式输出中的 [attacker_id, target_id] 对（两个整数，不允许嵌套）
+_PAIR_RE = re.compile(r"\[\s*(-?\d+)\s*,\s*(-?\d+)\s*\]")
+
+
+def _valid_pairs(arr: List[Any]) -> List[List[int]]:
+    """筛选 [int,int] 形式的整数对并去重（保持顺序）"""
+    out: List[List[int]] = []
+    seen = set()
+    for p in arr:
+        if type(p) is list and len(p) == 2:
+            a, b = p
+            if type(a) is int and type(b) is int and (a, b) not in seen:
+                seen.add((a, b))
+                out.append(p)
+    return out
+
+
+class _PairScanner:
+    """增量提取流式JSON中已闭合的整数对，每块只扫描新增部分，避免反复整体解析；重复的整数对只输出一次"""
+    __slots__ = ("_tail", "_seen")
+
+    def __init__(self):
+        # 尚未构成完整整数对的残留文本（至多从最后一个 '[' 开始）
+        self._tail = ""
+        self._seen = set()
+
+    def feed(self, delta: str) -> List[List[int]]:
+        text = self._tail + delta
+        out: List[List[int]] = []
+        seen = self._seen
+        end = 0
+        for m in _PAIR_RE.finditer(text):
+            end = m.end()
+            pair = (int(m.group(1)), int(m.group(2)))
+            if pair not in seen:
+                seen.add(pair)
+                out.append(list(pair))
+        # 被截断的整数对必然从最后一个 '[' 开始，之前的内容不再需要
+        cut = text.rfind("[", end)
+        self._tail = text[cut:] if cut >= 0 else ""
+        return out
+
+
 class LLMCompanyAttack(LLMRole):
+    # 结构相同（单位类型/数量/顺序一致）的作战区：按位置改写上次的攻击对后直接复用
+    _GENCACHE = GenCache()
+
     def get_counters_text(self) -> str:
-        return "\n".join([
-            "单位分类 (Category) 与代码 (Code) 对照表（所有阵营通用）：",
-            "- 重要目标: mcv (基地车)",
-            "- 步兵 (INF):",
-            "  * 炮灰 (INF_MEAT): e1",
-            "  * 反甲/防空 (INF_AT): e3",
-            "- 车辆 (VEHICLE):",
-            "  * 主战 (MBT): 2tnk, 3tnk, 4tnk, ctnk",
-            "  * 远程 (ARTY): v2rl, arty",
-            "  * 轻型/防空 (AFV): ftrk, jeep, 1tnk, apc",
-            "  * 后勤: harv (矿车)",
-            "- 防御 (DEFENSE):",
-            "  * 对空: sam, agun",
-            "  * 反步兵: ftur, pbox",
-            "  * 反坦克: tsla, gun",
-            "- 飞机 (AIRCRAFT): yak, mig, heli, mh60",
-            "- 建筑 (BUILDING): fact (建造厂), 其他 (weap, barr, pwr, dome, fix, proc...)",
-            "",
-            "全局核心规则：",
-            "1. **对空限制**：仅 e3, 4tnk, ftrk, heli, sam, agun 具有对空能力。严禁分配其他单位攻击飞机。",
-            "2. **斩首行动**：如果 mcv (基地车) 可见且在射程内，所有单位最高优先级攻击 mcv。",
-            "3. **威胁优先**：战斗单位/防御 > 建筑。拆建筑仅在无威胁时进行。",
-            "4. **建筑拆除**：优先拆除 fact (建造厂)，其他建筑归为最低优先级，不区分顺序。",
-            "",
-            "基于 UnitCategory 的兵种克制与优先攻击链：",
-            "- **INF_AT (e3)**: 优先攻击 -> MBT (主战坦克)。",
-            "- **INF_MEAT (e1)**: 优先攻击 -> INF_AT (e3)。(利用数量优势消耗高价值步兵)",
-            "- **MBT (2tnk/3tnk/ctnk)**: 优先攻击 -> ARTY (切后排) > MBT (对决) > AFV。",
-            "  * 战术建议：可分出少量 MBT 突袭敌方后排 ARTY，扰乱敌方阵型。",
-            "- **AFV (jeep/1tnk/apc)**: 优先攻击 -> ARTY (利用高机动偷袭) > INF/AFV。",
-            "- **AFV (ftrk)**: 优先攻击 -> AIRCRAFT (防空第一) > ARTY > INF/AFV。",
-            "- **ARTY (v2rl/arty)**: 优先攻击 -> 密集的 INF (AOE杀伤最大化) > ARTY (反炮兵) > DEFENSE (射程外拆塔)。",
-            "",
-            "通用决策建议（自主权）：",
-            "1. **综合决策**：请综合考虑兵种克制、敌方血量、距离、敌方密度和我方位置。",
-            "2. **多点开花**：避免将所有火力集中于一点，建议形成多个局部火力优势点。",
-            "3. **动态平衡**：在“优先击杀最近威胁”与“突袭高价值后排（如 ARTY/MCV）”之间寻找平衡。例如，用主力抗线的同时，分兵骚扰敌方后排。",
-        ])
+        return _COUNTERS_TEXT
+
+    def _gencache_pairs(self, prompt: str, zone: Dict[str, Any]) -> Optional[List[List[int]]]:
+        allies = _zone_ids(zone.get("allies"))
+        enemies = _zone_ids(zone.get("enemies"))
+        hit = self._GENCACHE.lookup(prompt, enemies + allies)
+        if hit is None:
+            return None
+        ally_ids, enemy_ids = set(allies), set(enemies)
+        pairs: List[List[int]] = []
+        for a, t in hit.response:
+            na, nt = hit.map_id(a), hit.map_id(t)
+            # 改写后的双方必须仍在当前作战区内
+            if na not in ally_ids or nt not in enemy_ids:
+                return None
+            pairs.append([na, nt])
+        return pairs or None
+
+    def _gencache_store(self, prompt: str, zone: Dict[str, Any], pairs: List[List[int]]) -> None:
+        if pairs:
+            self._GENCACHE.store(prompt, _zone_ids(zone.get("enemies")) + _zone_ids(zone.get("allies")), pairs)
+
+    def _stream_pairs(self, system_prompt: str, user_prompt: str):
+        scanner = _PairScanner()
+        for delta in self.client.chat_json_stream(system_prompt=system_prompt, user_prompt=user_prompt, temperature=0.1, max_tokens=16384):
+            if not delta:
+                continue
+            pairs = scanner.feed(delta)
+            if pairs:
+                yield pairs
+
     def plan_stream(self, counters_text: str, zone: Dict[str, Any], center: Dict[str, int], radius: int) -> Dict[str, Any]:
-        system_prompt = build_company_attack_prompt(counters_text, zone, center, radius)
-        user_prompt = "开始"
+        # 克制与规则作为 system，作战区实时数据作为 user
+        system_prompt = build_company_attack_static_prompt(counters_text or _COUNTERS_TEXT)
+        user_prompt = build_company_attack_user_prompt(zone, center, radius)
+        full_prompt = system_prompt + "\n" + user_prompt
         if not self.client:
             return {}
+        cached = self._gencache_pairs(full_prompt, zone)
+        if cached:
+            return {"pairs": cached}
         out_pairs: List[List[int]] = []
         try:
             if hasattr(self.client, 'chat_json_stream'):
-                buffer = ""
-                for delta in self.client.chat_json_stream(system_prompt=system_prompt, user_prompt=user_prompt, temperature=0.1, max_tokens=16384):
-                    if not delta:
-                        continue
-                    buffer += delta
-                    try:
-                        data = json.loads(buffer)
-                        arr = data if isinstance(data, list) else (data.get("pairs") if isinstance(data, dict) else None)
-                        if isinstance(arr, list):
-                            out_pairs = [p for p in arr if isinstance(p, list) and len(p) == 2 and all(isinstance(x, int) for x in p)]
-                    except Exception:
-                        pass
+                for pairs in self._stream_pairs(system_prompt, user_prompt):
+                    out_pairs.extend(pairs)
+                self._gencache_store(full_prompt, zone, out_pairs)
                 return {"pairs": out_pairs}
         except Exception:
-            pass
+            # 流在中途出错：已逐批校验的整数对仍然有效，直接保留（不入缓存），不再整体重试
+            if out_pairs:
+                return {"pairs": out_pairs}
         try:
             raw = self.client.chat_json(system_prompt=system_prompt, user_prompt=user_prompt, temperature=0.1, max_tokens=4096)
-            data = json.loads(raw)
+            data = json_utils.loads(raw)
             arr = data if isinstance(data, list) else (data.get("pairs") if isinstance(data, dict) else None)
             if isinstance(arr, list):
-                out_pairs = [p for p in arr if isinstance(p, list) and len(p) == 2 and all(isinstance(x, int) for x in p)]
+                out_pairs = _valid_pairs(arr)
+                self._gencache_store(full_prompt, zone, out_pairs)
         except Exception:
             pass
         return {"pairs": out_pairs}
 
     def plan_stream_execute(self, api: GameAPIClient, counters_text: str, zone: Dict[str, Any], center: Dict[str, int], radius: int) -> Dict[str, Any]:
-        system_prompt = build_company_attack_prompt(counters_text, zone, center, radius)
-        user_prompt = "开始"
+        # 克制与规则作为 system，作战区实时数据作为 user
+        system_prompt = build_company_attack_static_prompt(counters_text or _COUNTERS_TEXT)
+        user_prompt = build_company_attack_user_prompt(zone, center, radius)
+        full_prompt = system_prompt + "\n" + user_prompt
         out_pairs: List[List[int]] = []
         if not self.client:
             return {"pairs": out_pairs}
+        cached = self._gencache_pairs(full_prompt, zone)
+        if cached:
+            self.execute_pairs(api, cached)
+            return {"pairs": cached}
         try:
             if hasattr(self.client, 'chat_json_stream'):
-                buffer = ""
-                for delta in self.client.chat_json_stream(system_prompt=system_prompt, user_prompt=user_prompt, temperature=0.1, max_tokens=16384):
-                    if not delta:
-                        continue
-                    buffer += delta
-                    try:
-                        data = json.loads(buffer)
-                        arr = data if isinstance(data, list) else (data.get("pairs") if isinstance(data, dict) else None)
-                        if isinstance(arr, list):
-                            pairs = [p for p in arr if isinstance(p, list) and len(p) == 2 and all(isinstance(x, int) for x in p)]
-                            if pairs:
-                                out_pairs = pairs
-                                self.execute_pairs(api, pairs)
-                    except Exception:
-                        pass
+                # 每收到一批完整的整数对即下发，无需等待整个数组结束
+                for pairs in self._stream_pairs(system_prompt, user_prompt):
+                    out_pairs.extend(pairs)
+                    self.execute_pairs(api, pairs)
+                self._gencache_store(full_prompt, zone, out_pairs)
                 return {"pairs": out_pairs}
         except Exception:
-            pass
+            # 流在中途出错：已逐批校验的整数对仍然有效，直接保留（不入缓存），不再整体重试
+            if out_pairs:
+                return {"pairs": out_pairs}
         return self.plan_stream(counters_text, zone, center, radius)
 
     def execute_pairs(self, api: GameAPIClient, pairs: List[List[int]]) -> bool:
         if not pairs:
             return False
         try:
-            attackers = [p[0] for p in pairs]
-            targets = [p[1] for p in pairs]
-            a_actors = api.query_actor(TargetsQueryParam(actorId=attackers)) if attackers else []
-            t_actors = api.query_actor(TargetsQueryParam(actorId=targets)) if targets else []
+            attackers = dict.fromkeys(p[0] for p in pairs)
+            targets = dict.fromkeys(p[1] for p in pairs)
+            # 攻守双方合并为一次查询，本地再拆分
+            by_id = {a.actor_id: a for a in api.query_actor(TargetsQueryParam(actorId=list({**attackers, **targets})))}
+            a_actors = [by_id[i] for i in attackers if i in by_id]
+            t_actors = [by_id[i] for i in targets if i in by_id]
             return bool(api.attack_targets(a_actors, t_actors))
         except Exception:
             return False
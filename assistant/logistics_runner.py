@@ -1,12 +1,17 @@
 import threading
 import time
+from collections import deque
 from typing import Optional, Dict, Any
 
 from .api_client import GameAPIClient
 from .unit_mapping import UnitMapper
+from .prompts.logistics import plan_signature as logistics_plan_signature
 
 
 class LogisticsRunner:
+    # 局势签名未变时的最长跳过时间（秒），到期强制重新规划一次
+    FORCE_REPLAN_INTERVAL = 60.0
+
     def __init__(self, ai_hq):
         self.ai_hq = ai_hq
         self._running = False
@@ -15,8 +20,15 @@ class LogisticsRunner:
         self._task_directive: Optional[Dict[str, Any]] = None
         self._recruitment_advisory: Optional[Dict[str, Any]] = None
         self._lock = threading.Lock()
-        self._recent_decisions: list = []
+        # 任务/留言更新时唤醒循环，否则按 _interval 周期刷新
+        self._cv = threading.Condition(self._lock)
+        self._dirty = False
+        # 近5次已提交的建造决策（满后自动淘汰最早一条）
+        self._recent_decisions: deque = deque(maxlen=5)
         self._display_summary: Optional[str] = None
+        # 上一次规划的局势签名与时间；签名未变化时跳过本轮规划
+        self._last_signature: Optional[int] = None
+        self._last_plan_at = 0.0
         
 
     def start(self):
@@ -27,23 +39,38 @@ class LogisticsRunner:
         self._thread.start()
 
     def stop(self):
-        self._running = False
+        with self._cv:
+            self._running = False
+            self._cv.notify()
+
+    def _notify_locked(self):
+        self._dirty = True
+        self._cv.notify()
+
+    def _wait(self):
+        with self._cv:
+            if self._running and not self._dirty:
+                self._cv.wait(timeout=self._interval)
 
     def set_task(self, task_params: Optional[Dict[str, Any]]):
         with self._lock:
             self._task_directive = task_params or None
+            self._notify_locked()
 
     def set_task_directive(self, task_params: Optional[Dict[str, Any]]):
         with self._lock:
             self._task_directive = task_params or None
+            self._notify_locked()
 
     def clear_task(self):
         with self._lock:
             self._task_directive = None
+            self._notify_locked()
 
     def set_advisory(self, advisory: Optional[Dict[str, Any]]):
         with self._lock:
             self._recruitment_advisory = advisory or None
+            self._notify_locked()
 
     
 
@@ -54,6 +81,8 @@ class LogisticsRunner:
                 with self._lock:
                     directive = self._task_directive
                     advisory = self._recruitment_advisory
+                    dirty = self._dirty
+                    self._dirty = False
                 try:
                     cp = getattr(self.ai_hq, 'command_parser', None)
                     if cp:
@@ -63,8 +92,16 @@ class LogisticsRunner:
                             setattr(cp, '_logistics_task_text', '自主决策中' if self._running else '待命中')
                 except Exception:
                     pass
-                pass
-                plan = self.ai_hq.logistics.plan(bf, task_directive=directive, recruitment_advisory=advisory, recent_decisions=self._recent_decisions[:])
+                recent = list(self._recent_decisions)
+                key = logistics_plan_signature(bf, directive, advisory, recent)
+                now = time.monotonic()
+                # 无外部更新且局势签名未变化：跳过本轮规划与执行（超过强制间隔时仍重新规划）
+                if not dirty and key is not None and key == self._last_signature and now - self._last_plan_at < self.FORCE_REPLAN_INTERVAL:
+                    self._wait()
+                    continue
+                self._last_signature = key
+                self._last_plan_at = now
+                plan = self.ai_hq.logistics.plan(bf, task_directive=directive, recruitment_advisory=advisory, recent_decisions=recent)
                 pass
                 # 执行工具
                 result_desc = self.ai_hq.logistics.execute(plan)
@@ -85,8 +122,6 @@ class LogisticsRunner:
                             "queue": str(t.get("queue") or "")
                         }
                         self._recent_decisions.append(item)
-                    if len(self._recent_decisions) > 5:
-                        self._recent_decisions = self._recent_decisions[-5:]
                 except Exception:
                     pass
                 # 任务完成标记
@@ -99,5 +134,5 @@ class LogisticsRunner:
                     pass
             except Exception:
                 pass
-            # 间隔
-            time.sleep(self._interval)
+            # 间隔（可被任务/留言更新提前唤醒）
+            self._wait()
@@ -1,22 +1,29 @@
-import json
+import functools
 
-def build_system_prompt(counters_text, zone, center, radius):
+from .. import json_utils
+
+
+@functools.lru_cache(maxsize=4)
+def build_static_prompt(counters_text):
+    """固定部分：角色、克制关系与输出格式（仅随克制文本变化，按文本缓存）"""
     parts = []
     parts.append("你是连长（战斗专家）。根据兵种克制、位置与血量，为每个我方单位分配一个合理的敌方目标。")
     parts.append("克制与优先序：\n" + (counters_text or ""))
     parts.append("作战范围：以目标坐标为圆心、半径为R的区域内所有敌我单位；若无任何敌我单位则不输出。")
     parts.append("输出JSON：[[ally_id,enemy_id],...]；直接输出数组；允许集火。")
-    try:
-        parts.append("中心：" + json.dumps(center or {}, ensure_ascii=False))
-    except Exception:
-        parts.append("中心：{}")
+    return "\n".join(parts)
+
+
+def build_user_prompt(zone, center, radius):
+    """实时部分：作战中心、半径与区域内敌我单位"""
+    parts = []
+    parts.append("中心：" + json_utils.safe_dumps(center or {}, "{}", sort_keys=True))
     parts.append("半径：" + str(int(radius or 0)))
-    try:
-        parts.append("敌方：" + json.dumps(zone.get("enemies", []) or [], ensure_ascii=False))
-    except Exception:
-        parts.append("敌方：[]")
-    try:
-        parts.append("我方：" + json.dumps(zone.get("allies", []) or [], ensure_ascii=False))
-    except Exception:
-        parts.append("我方：[]")
+    parts.append("敌方：" + json_utils.safe_dumps(zone.get("enemies", []) or [], "[]"))
+    parts.append("我方：" + json_utils.safe_dumps(zone.get("allies", []) or [], "[]"))
     return "\n".join(parts)
+
+
+def build_system_prompt(counters_text, zone, center, radius):
+    """完整提示词（固定部分 + 实时部分）"""
+    return build_static_prompt(counters_text) + "\n" + build_user_prompt(zone, center, radius)
@@ -4,12 +4,28 @@ from typing import Optional, Dict, Any, List
 
 
 class RecruitmentRunner:
+    # 局势签名未变时的最长跳过时间（秒），到期强制重新规划一次
+    FORCE_REPLAN_INTERVAL = 60.0
+
     def __init__(self, ai_hq):
         self.ai_hq = ai_hq
         self._running = False
         self._thread: Optional[threading.Thread] = None
         self._interval = 5.0
         self._task: Optional[Dict[str, Any]] = None
+        self._lock = threading.Lock()
+        # 任务更新或停止时唤醒循环，否则按 _interval 周期刷新
+        self._cv = threading.Condition(self._lock)
+        self._dirty = False
+        # 上一次规划的局势签名与时间；未编入单位、己方单位数与任务都未变时跳过本轮规划
+        self._last_signature: Optional[int] = None
+        self._last_plan_at = 0.0
+        # 任务文本缓存：任务对象未替换时直接复用上次提取的文本
+        self._task_src: Optional[Any] = None
+        self._task_text = ''
+        # 旅长信息缓存：旅长对象与辖区不变时复用（调用方只读）
+        self._brigades_sig: Optional[tuple] = None
+        self._brigades_info: List[Dict[str, Any]] = []
 
     def start(self):
         if self._running:
@@ -19,21 +35,63 @@ class RecruitmentRunner:
         self._thread.start()
 
     def stop(self):
-        self._running = False
+        with self._cv:
+            self._running = False
+            self._cv.notify()
+        t = self._thread
+        if t is not None and t is not threading.current_thread():
+            t.join(timeout=1.0)
 
     def set_task(self, task: Optional[Any]):
-        self._task = task
+        with self._cv:
+            self._task = task
+            self._dirty = True
+            self._cv.notify()
+
+    def _wait(self):
+        with self._cv:
+            if self._running and not self._dirty:
+                self._cv.wait(timeout=self._interval)
+
+    def _derive_task_text(self, t: Optional[Any]) -> str:
+        if t is self._task_src:
+            return self._task_text
+        if isinstance(t, dict):
+            v = t.get('desc') or t.get('task') or t.get('name') or ''
+        else:
+            v = t if t is not None else ''
+        text = v if isinstance(v, str) else str(v)
+        self._task_src = t
+        self._task_text = text
+        return text
+
+    def _get_brigades_info(self) -> List[Dict[str, Any]]:
+        brigades = self.ai_hq.brigades
+        sig = tuple((id(b), b.bounds) for b in brigades)
+        if sig != self._brigades_sig:
+            self._brigades_info = [{"name": getattr(b, 'name', ''), "code": getattr(b, 'code', ''), "bounds": {"x0": b.bounds[0], "y0": b.bounds[1], "x1": b.bounds[2], "y1": b.bounds[3]}} for b in brigades]
+            self._brigades_sig = sig
+        return self._brigades_info
+
+    def _signature(self, snap: Dict[str, Any], task_text: str) -> Optional[int]:
+        """征兵规划的输入签名：己方单位数、未编入单位ID集合与任务文本"""
+        try:
+            allies = snap.get("allies", []) or []
+            assigned = self.ai_hq.company.unit_to_company
+            unassigned = frozenset(u.get("id") for u in allies if u.get("id") not in assigned)
+            return hash((len(allies), unassigned, task_text))
+        except Exception:
+            return None
 
     def _loop(self):
         while self._running:
             try:
                 snap = self.ai_hq.staff.snapshot()
-                t = self._task
-                task_text = ''
-                if isinstance(t, dict):
-                    task_text = str(t.get('desc') or t.get('task') or t.get('name') or '')
-                elif t is not None:
-                    task_text = str(t)
+                with self._lock:
+                    t = self._task
+                    dirty = self._dirty
+                    self._dirty = False
+                task_text = self._derive_task_text(t)
                 if not task_text:
                     task_text = '自主决策中' if self._running else '待命中'
                 try:
@@ -46,10 +104,15 @@ class RecruitmentRunner:
                     setattr(self.ai_hq, "_last_allies", snap.get("allies", []) or [])
                 except Exception:
                     pass
-                brigades_info: List[Dict[str, Any]] = []
-                for b in self.ai_hq.brigades:
-                    brigades_info.append({"name": getattr(b, 'name', ''), "code": getattr(b, 'code', ''), "bounds": {"x0": b.bounds[0], "y0": b.bounds[1], "x1": b.bounds[2], "y1": b.bounds[3]}})
-                pass
+                key = self._signature(snap, task_text)
+                now = time.monotonic()
+                # 无新任务且局势签名未变化：跳过本轮规划（超过强制间隔时仍重新规划）
+                if not dirty and key is not None and key == self._last_signature and now - self._last_plan_at < self.FORCE_REPLAN_INTERVAL:
+                    self._wait()
+                    continue
+                self._last_signature = key
+                self._last_plan_at = now
+                brigades_info = self._get_brigades_info()
                 self.ai_hq.recruit.plan_and_apply(snap, brigades_info, task=task_text)
                 try:
                     for b in self.ai_hq.brigades:
@@ -60,4 +123,4 @@ class RecruitmentRunner:
                 pass
             except Exception:
                 pass
-            time.sleep(self._interval)
+            self._wait()
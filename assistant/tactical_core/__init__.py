@@ -1,3 +1,3 @@
 from .enhancer import BiodsEnhancer
-from .constants import UnitCategory, UNIT_CATEGORY_MAP, IGNORED_UNIT_CODES
+from .constants import UnitCategory, UNIT_CATEGORY_MAP, IGNORED_UNIT_CODES, IGNORED_UNIT_RE
 from .entity_manager import EntityManager, TacticalEntity
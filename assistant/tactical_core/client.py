@@ -6,14 +6,74 @@ Tactical Core 独立 API 客户端
 
 import socket
 import json
+import threading
 import uuid
 import time
-from typing import Dict, List, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Any, Optional, Tuple
+
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:  # 可选依赖，缺失时使用标准库
+    _json_loads = json.loads
+
+# 双阵营并发查询用线程池（首次使用时创建）
+_QUERY_POOL: Optional[ThreadPoolExecutor] = None
+_QUERY_POOL_LOCK = threading.Lock()
+
+
+def _query_pool() -> ThreadPoolExecutor:
+    global _QUERY_POOL
+    with _QUERY_POOL_LOCK:
+        if _QUERY_POOL is None:
+            _QUERY_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="TacticalQuery")
+        return _QUERY_POOL
 
 class TacticalClient:
     def __init__(self, host="localhost", port=7445):
         self.server_address = (host, port)
         self.api_version = "1.0"
+        # 已解析的服务器地址（避免每次请求都做一次 localhost 解析）
+        self._resolved_address: Optional[Tuple[int, Tuple]] = None
+
+    def _open_connection(self, timeout: float) -> socket.socket:
+        """建立到游戏的TCP连接（服务器一次请求一个连接、应答后即关闭，连接无法复用）"""
+        # 先取到局部变量：双阵营查询会在两个线程中同时建连
+        resolved = self._resolved_address
+        if resolved is None:
+            host, port = self.server_address
+            infos = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+            # 优先IPv4：Windows 下 localhost 先试 ::1 会额外耗时
+            infos.sort(key=lambda i: 0 if i[0] == socket.AF_INET else 1)
+            resolved = self._resolved_address = (infos[0][0], infos[0][4])
+        family, sockaddr = resolved
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        try:
+            # 小报文请求，关闭 Nagle 避免发送被延迟合并
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            sock.settimeout(timeout)
+            sock.connect(sockaddr)
+        except Exception:
+            sock.close()
+            # 地址可能已失效，下次重新解析
+            self._resolved_address = None
+            raise
+        return sock
+
+    @staticmethod
+    def _recv_response(sock: socket.socket) -> bytes:
+        """读取完整应答：服务器写完即关闭连接，读到EOF即为完整报文（大缓冲减少 recv 次数）"""
+        buf = bytearray()
+        while True:
+            try:
+                chunk = sock.recv(65536)
+            except socket.timeout:
+                break
+            if not chunk:
+                break
+            buf += chunk
+        return bytes(buf)
 
     def _send_request(self, command: str, params: dict) -> dict:
         request_id = str(uuid.uuid4())
@@ -26,22 +86,9 @@ class TacticalClient:
         }
         
         try:
-            with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-                sock.settimeout(2.0)
-                sock.connect(self.server_address)
+            with self._open_connection(2.0) as sock:
                 sock.sendall(json.dumps(request_data).encode('utf-8'))
-                
-                chunks = []
-                while True:
-                    try:
-                        chunk = sock.recv(4096)
-                        if not chunk: break
-                        chunks.append(chunk)
-                    except socket.timeout:
-                        break
-                        
-                response_str = b''.join(chunks).decode('utf-8')
-                return json.loads(response_str)
+                return _json_loads(self._recv_response(sock))
         except Exception as e:
             # 战术模块允许偶尔通信失败，不抛出致命异常，仅返回空
             print(f"[TacticalClient] Error: {e}")
@@ -63,6 +110,25 @@ class TacticalClient:
         data = resp.get("data", {})
         return data.get("actors", []) if data else []
 
+    def query_all_units_both(self) -> Tuple[Optional[List[dict]], Optional[List[dict]]]:
+        """
+        一次取回双方单位：(己方, 敌方)
+        协议不支持单次请求返回两个阵营，敌方查询在线程池中与己方查询并发进行；任一侧失败时该侧为 None
+        """
+        try:
+            enemy_future = _query_pool().submit(self.query_all_units, "敌方")
+        except Exception:
+            enemy_future = None
+        allies = self.query_all_units("己方")
+        if enemy_future is not None:
+            try:
+                enemies = enemy_future.result()
+            except Exception:
+                enemies = None
+        else:
+            enemies = self.query_all_units("敌方")
+        return allies, enemies
+
     def attack_target(self, attacker_id: int, target_id: int) -> None:
         params = {
             "attackers": {"actorId": [attacker_id]},
@@ -79,3 +145,30 @@ class TacticalClient:
             "isAssaultMove": 1 if assault else 0
         }
         self._send_request("move_actor", params)
+
+    def attack_batch(self, pairs: Iterable[Tuple[int, int]]) -> None:
+        """批量攻击：同一目标的攻击者合并为一次 attack 请求"""
+        by_target: Dict[int, List[int]] = {}
+        for attacker_id, target_id in pairs:
+            by_target.setdefault(target_id, []).append(attacker_id)
+        for target_id, attackers in by_target.items():
+            params = {
+                "attackers": {"actorId": attackers},
+                "targets": {"actorId": [target_id]}
+            }
+            self._send_request("attack", params)
+
+    def move_batch(self, moves: Iterable[Tuple[int, str, int, bool, bool]]) -> None:
+        """批量移动：(actor_id, direction, distance, assault, is_attack_move) 参数相同的单位合并为一次 move_actor 请求"""
+        groups: Dict[Tuple[str, int, bool, bool], List[int]] = {}
+        for actor_id, direction, distance, assault, is_attack_move in moves:
+            groups.setdefault((direction, distance, bool(assault), bool(is_attack_move)), []).append(actor_id)
+        for (direction, distance, assault, is_attack_move), actor_ids in groups.items():
+            params = {
+                "targets": {"actorId": actor_ids},
+                "direction": direction,
+                "distance": distance,
+                "isAttackMove": 1 if is_attack_move else 0,
+                "isAssaultMove": 1 if assault else 0
+            }
+            self._send_request("move_actor", params)
@@ -1,5 +1,8 @@
 # -*- coding: utf-8 -*-
+import re
+import sys
 from enum import Enum
+from types import MappingProxyType
 
 class UnitCategory(Enum):
     ARTY = "ARTY"       # V2RL: 超视距、脆皮、面伤（火炮类）
@@ -10,6 +13,10 @@ class UnitCategory(Enum):
     DEFENSE = "DEFENSE"   # 防御性建筑（未来备用）
     OTHER = "OTHER"       # 其他战斗单位（默认归类）
 
+    # 成员为单例、相等即同一对象：改用 C 实现的身份哈希，避免 Enum 默认在 Python 层计算 hash(name)
+    # （热循环中按类别查表、做集合判断时每次都会调用）
+    __hash__ = object.__hash__
+
 # 单位分类定义（包含英文代码和中文）
 # 结构: (Category, StandardCode, [Aliases])
 _UNIT_DEFINITIONS = [
@@ -51,20 +58,53 @@ _UNIT_DEFINITIONS = [
 UNIT_CATEGORY_MAP = {}
 STANDARD_NAME_MAP = {}
 
+# 键与值统一驻留（intern），使 unit_code 的字典查找与相等比较可直接按指针命中
 for category, std_code, aliases in _UNIT_DEFINITIONS:
+    std_code = sys.intern(std_code)
     # 注册标准代码
     UNIT_CATEGORY_MAP[std_code] = category
     STANDARD_NAME_MAP[std_code] = std_code
     
     # 注册别名
     for alias in aliases:
-        lower_alias = alias.lower()
+        lower_alias = sys.intern(alias.lower())
         UNIT_CATEGORY_MAP[lower_alias] = category
         STANDARD_NAME_MAP[lower_alias] = std_code
 
+# 常用类别组合（热循环中做成员判断）
+VEHICLE_CATEGORIES = frozenset((UnitCategory.MBT, UnitCategory.ARTY, UnitCategory.AFV))  # 载具
+INFANTRY_CATEGORIES = frozenset((UnitCategory.INF_MEAT, UnitCategory.INF_AT))           # 步兵
+
+# 威胁基础权重表：THREAT_WEIGHT[己方类别][敌方类别]
+# 默认 10.0；火炮高威胁 15.0；反坦克步兵对载具(MBT/AFV)高威胁 20.0
+THREAT_WEIGHT = {
+    ally_cat: {
+        enemy_cat: (
+            15.0 if enemy_cat == UnitCategory.ARTY
+            else 20.0 if enemy_cat == UnitCategory.INF_AT and ally_cat in (UnitCategory.MBT, UnitCategory.AFV)
+            else 10.0
+        )
+        for enemy_cat in UnitCategory
+    }
+    for ally_cat in UnitCategory
+}
+
+# 各单位攻击距离（保守值，浮点以便精确判定；只读，势场与硬中断共用）
+ATTACK_RANGES = MappingProxyType({
+    "v2rl": 10.0,
+    "3tnk": 4.75,
+    "4tnk": 4.75,
+    "ftrk": 6.0,
+    "e1": 5.0,
+    "e3": 5.0,
+})
+
 # 必须从状态机中剔除的非战斗实体（黑名单）
-IGNORED_UNIT_CODES = {
+IGNORED_UNIT_CODES = {sys.intern(c) for c in (
     "mpspawn",  # 出生点逻辑实体
     "camera",  # 摄像机控制点(?)
     "husk",  # 残骸
-}
+)}
+
+# 黑名单子串匹配合并为单个正则，一次扫描完成（代码中包含任意黑名单关键字即过滤）
+IGNORED_UNIT_RE = re.compile("|".join(map(re.escape, sorted(IGNORED_UNIT_CODES))))
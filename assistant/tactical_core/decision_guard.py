@@ -1,10 +1,17 @@
 # -*- coding: utf-8 -*-
+from collections import defaultdict
 from typing import List, Tuple, Dict, Optional
+import bisect
 import math
 
 from .entity_manager import EntityManager, TacticalEntity
 from .constants import UnitCategory
 
+# 攻击对的 reason 标签（调用方按标签区分日志显示，比较时可直接按集合成员判断）
+REASON_UPSTREAM = "[协同回退:上游指令]"
+REASON_FALLBACK = "[协同回退:自动接管]"
+COHESION_REASONS = frozenset((REASON_UPSTREAM, REASON_FALLBACK))
+
 class DecisionGuard:
     """
     目标管理与协同回退 (Target Management & Group Cohesion)
@@ -19,10 +26,11 @@ class DecisionGuard:
         # 协同搜索半径（曼哈顿距离）
         self.cohesion_radius = 10 
 
-    def process_decisions(self, expert_pairs: List[Tuple[int, int]]) -> List[Tuple[int, int, str]]:
+    def process_decisions(self, expert_pairs: List[Tuple[int, int]], active_allies: Optional[List[TacticalEntity]] = None) -> List[Tuple[int, int, str]]:
         """
         处理一帧的决策流程
         :param expert_pairs: 上游传入的 [(attacker_id, target_id), ...] (流式增量或全量)
+        :param active_allies: 调用方本帧已收集的存活单位（可含 OTHER 类，此处再筛选）；缺省时自行收集
         :return: 最终修正后的攻击对 [(attacker_id, target_id, reason), ...]
         """
         # 1. 注册上游分配
@@ -33,34 +41,53 @@ class DecisionGuard:
         final_pairs: List[Tuple[int, int, str]] = []
         
         # 收集所有活动单位的引用，避免重复字典查找
-        active_allies = [
-            a for a in self.em.allies.values() 
-            if a.category != UnitCategory.OTHER and a.is_active
-        ]
+        if active_allies is None:
+            active_allies = [a for a in self.em.allies.values() if a.is_active]
+        other = UnitCategory.OTHER
+        active_allies = [a for a in active_allies if a.category is not other]
         
-        # 第一遍扫描：验证现有目标有效性
-        for ally in active_allies:
+        # 单遍扫描：验证现有目标有效性，并按 unit_code 收集持有有效目标的友军 (x, 原顺序下标, 实体)
+        # 协同回退只会跟随同类型且目标有效的友军，分桶后无需再逐个比较类型、排除自己
+        by_code: Dict[str, List[Tuple[int, int, TacticalEntity]]] = defaultdict(list)
+        needy: List[Tuple[int, TacticalEntity]] = []
+        for idx, ally in enumerate(active_allies):
             # 检查当前分配的目标是否有效
             if not self._is_target_valid(ally.assigned_target_id):
                 # 目标失效（死/消失），清除状态，等待后续填补
                 self.em.update_assignment(ally.actor_id, None)
-            elif ally.assigned_target_id is not None:
+                needy.append((idx, ally))
+            else:
                 # 有效的专家/存量指令直接放行
-                final_pairs.append((ally.actor_id, ally.assigned_target_id, "[协同回退:上游指令]"))
+                final_pairs.append((ally.actor_id, ally.assigned_target_id, REASON_UPSTREAM))
+                by_code[ally.unit_code].append((ally.position[0], idx, ally))
+
+        if not needy:
+            return final_pairs
+
+        # 各桶按 x 排序（下标唯一，不会比较到实体），回退搜索从自身 x 处向两侧扩展并提前终止
+        xs_by_code: Dict[str, List[int]] = {}
+        for code, bucket in by_code.items():
+            bucket.sort()
+            xs_by_code[code] = [entry[0] for entry in bucket]
 
         # 3. 对无有效目标的单位执行协同回退
-        for ally in active_allies:
-            # 如果已有有效目标，跳过
-            if ally.assigned_target_id is not None:
+        for idx, ally in needy:
+            bucket = by_code.get(ally.unit_code)
+            if not bucket:
                 continue
-                
+            xs = xs_by_code[ally.unit_code]
+
             # 尝试协同回退
-            new_target_id = self._find_fallback_target(ally, active_allies)
+            new_target_id = self._find_fallback_target(ally, bucket, xs)
             
             if new_target_id:
-                # 更新状态
+                # 更新状态；接管后同样可被后续同类单位跟随，按 (x, 下标) 插回桶中
                 self.em.update_assignment(ally.actor_id, new_target_id)
-                final_pairs.append((ally.actor_id, new_target_id, "[协同回退:自动接管]"))
+                final_pairs.append((ally.actor_id, new_target_id, REASON_FALLBACK))
+                x = ally.position[0]
+                pos = bisect.bisect_left(bucket, (x, idx))
+                bucket.insert(pos, (x, idx, ally))
+                xs.insert(pos, x)
             # else: 确实无目标可用，保持待命
                 
         return final_pairs
@@ -76,40 +103,44 @@ class DecisionGuard:
             return False
         return True
 
-    def _find_fallback_target(self, me: TacticalEntity, candidates: List[TacticalEntity]) -> Optional[int]:
+    def _find_fallback_target(self, me: TacticalEntity, candidates: List[Tuple[int, int, TacticalEntity]], xs: List[int]) -> Optional[int]:
         """
         寻找协同目标：
-        1. 遍历所有友军
-        2. 筛选条件：同类型(unit_code) + 有有效目标 + 不是自己
-        3. 决策：选择距离自己最近的友军，继承其目标
+        1. candidates 为与自己同类型(unit_code)且有有效目标的友军 [(x, 顺序下标, 实体), ...]，按 x 排序；xs 为对应的 x 列表
+        2. 决策：选择距离自己最近的友军，继承其目标（距离相同取顺序在前者）
+        3. 从自身 x 处向两侧交替扩展，|dx| 已超过当前最近距离时即可停止
         """
         best_target_id = None
         min_dist = 999999
+        best_idx = -1
         
         mx, my = me.position
+        n = len(xs)
+        right = bisect.bisect_left(xs, mx)
+        left = right - 1
         
-        for buddy in candidates:
-            # 排除自己
-            if buddy.actor_id == me.actor_id:
-                continue
+        while left >= 0 or right < n:
+            # 取 |dx| 较小的一侧
+            if right >= n or (left >= 0 and mx - xs[left] <= xs[right] - mx):
+                dx = mx - xs[left]
+                _, idx, buddy = candidates[left]
+                left -= 1
+            else:
+                dx = xs[right] - mx
+                _, idx, buddy = candidates[right]
+                right += 1
+            if dx > min_dist:
+                break
             
-            # 必须是同类型单位 (原代码隐式限制在 _controllers 集合中，这里显式判断)
-            if buddy.unit_code != me.unit_code:
-                continue
-                
-            # 友军必须有有效目标
-            if not self._is_target_valid(buddy.assigned_target_id):
-                continue
-                
-            bx, by = buddy.position
-            dist = abs(mx - bx) + abs(my - by)
+            dist = dx + abs(my - buddy.position[1])
             
             # 协同半径限制 (可选)
             # if dist > self.cohesion_radius:
             #    continue
             
-            if dist < min_dist:
+            if dist < min_dist or (dist == min_dist and idx < best_idx):
                 min_dist = dist
+                best_idx = idx
                 best_target_id = buddy.assigned_target_id
                 
         return best_target_id
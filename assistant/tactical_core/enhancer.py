@@ -10,17 +10,25 @@ Biods 算法增强 V2.0 (Tactical Core Facade)
 import threading
 import time
 import os
-from typing import List, Tuple, Optional, Any, Union
+from typing import Dict, List, Tuple, Optional, Any, Union
 
 from .entity_manager import EntityManager
-from .decision_guard import DecisionGuard
+from .decision_guard import DecisionGuard, COHESION_REASONS
 from .potential_field import PotentialField
-from .interrupt_logic import InterruptLogic
+from .interrupt_logic import InterruptLogic, REASON_RETREAT
 from .client import TacticalClient
 from .ui import TacticalLogWindow
 
 from .constants import UnitCategory
 
+_DEBUG_VALUES = frozenset(("1", "true", "yes"))
+
+
+def _debug_from_env() -> bool:
+    # LLM_DEBUG 可能在启动后由界面开启，主循环每帧刷新一次，单条日志不再各自读取环境变量
+    return str(os.environ.get("LLM_DEBUG", "0")).lower() in _DEBUG_VALUES
+
+
 class BiodsEnhancer:
     def __init__(self, enabled: bool = True):
         self.enabled = enabled
@@ -33,6 +41,7 @@ class BiodsEnhancer:
         
         # 日志窗口
         self._log_window: Optional[TacticalLogWindow] = None
+        self._debug_on = _debug_from_env()
         
         # 子模块实例
         self.em: Optional[EntityManager] = None
@@ -134,6 +143,7 @@ class BiodsEnhancer:
                     break
             
             try:
+                self._debug_on = _debug_from_env()
                 if not self.em or not self.decision_guard:
                     time.sleep(0.1)
                     continue
@@ -141,14 +151,14 @@ class BiodsEnhancer:
                 # 1. 状态同步 (约 10Hz)
                 self.em.update()
                 
-                # 简单统计活跃单位
-                active_ally_count = sum(1 for a in self.em.allies.values() if a.is_active)
-                active_enemy_count = sum(1 for e in self.em.enemies.values() if e.is_active)
+                # 本帧存活单位只收集一次，供目标维护与势场微操共用
+                alive_allies = [a for a in self.em.allies.values() if a.is_active]
                 if self._tick_count % 50 == 0: # 每5秒左右输出一次心跳
-                    self._log_debug(f"Tick {self._tick_count}: Allies={active_ally_count}, Enemies={active_enemy_count}")
+                    active_enemy_count = sum(1 for e in self.em.enemies.values() if e.is_active)
+                    self._log_debug(f"Tick {self._tick_count}: Allies={len(alive_allies)}, Enemies={active_enemy_count}")
 
                 # 2. 目标维护
-                active_pairs = self.decision_guard.process_decisions([])
+                active_pairs = self.decision_guard.process_decisions([], active_allies=alive_allies)
                 
                 # 3. 硬中断
                 interrupt_moves, interrupt_attacks = self.interrupt_logic.check_interrupts()
@@ -159,7 +169,7 @@ class BiodsEnhancer:
                 interrupted_units.update(att[0] for att in interrupt_attacks)
                 
                 # 4. 势场微操 (排除被硬中断单位)
-                active_allies = [a for a in self.em.allies.values() if a.is_active and a.actor_id not in interrupted_units]
+                active_allies = [a for a in alive_allies if a.actor_id not in interrupted_units]
                 pf_moves = self.potential_field.calculate_moves(active_allies)
                 
                 # 记录因势场微操而移动的单位，稍后需要恢复其攻击任务
@@ -194,93 +204,63 @@ class BiodsEnhancer:
                 ]
                 
                 # 区分 Log 显示逻辑：
-                # 1. 上游分配指令 (reason 为空或包含"上游指令") -> 不显示 Log (log=False)
-                # 2. 协同回退/自动接管 (reason 包含"协同回退") -> 完全显示 Log (log=True)
-                
-                upstream_pairs = []
-                cohesion_pairs = []
-                
-                for p in filtered_active_pairs:
-                    reason = p[2] if len(p) > 2 else ""
-                    if "协同回退" in reason:
-                        cohesion_pairs.append(p)
-                    else:
-                        upstream_pairs.append(p)
-                
-                # 执行上游指令 (静默)
-                if upstream_pairs:
-                    self._execute_attacks(upstream_pairs, log=False)
-                    
-                # 执行协同回退 (显示 Log)
-                if cohesion_pairs:
-                    self._execute_attacks(cohesion_pairs, log=True)
-                pass
-
-            except Exception as e:
-                self._log_debug(f"Loop error: {e}")
+                # 1. 上游分配指令 (reason 为空或不带协同回退标签) -> 不显示 Log
+                # 2. 协同回退/自动接管 (reason 为 COHESION_REASONS 之一) -> 完全显示 Log
+                # 全部攻击对合并为一次批量下发，仅 Log 按标签区分
+                if filtered_active_pairs:
+                    self._execute_attacks(filtered_active_pairs, log=False)
+                    if self._log_enabled():
+                        for p in filtered_active_pairs:
+                            if len(p) > 2 and p[2] in COHESION_REASONS:
+                                self._log_attack(p)
 
             except Exception as e:
+                # 单帧出错不终止战术线程：记录后下一帧继续
                 self._log_debug(f"Loop error: {e}")
             
             time.sleep(0.1)
 
-    def _execute_moves(self, moves: dict) -> None:
+    def _execute_moves(self, moves: Dict[int, Tuple[str, int, str]]) -> None:
+        """moves: {actor_id: (direction, distance, reason)}，由势场微操与硬中断统一产出"""
         if not moves or not self._client:
             return
-        # 按方向分组以备未来优化，目前简单遍历
-        for aid, move_data in moves.items():
-            direction = None
-            distance = 1
-            reason = ""
-            
-            # 兼容处理: 支持 (direction, distance, reason)
-            if isinstance(move_data, (tuple, list)):
-                direction = move_data[0]
-                if len(move_data) > 1:
-                    distance = int(move_data[1])
-                if len(move_data) > 2:
-                    reason = str(move_data[2])
-            else:
-                direction = str(move_data)
-                distance = 1
-
+        # 判断是否为 MBT：直接查己方类别索引
+        mbt_ids = self.em.allies_by_cat[UnitCategory.MBT] if self.em else {}
+        log = self._log_enabled()
+        # 先收集，再按 (方向, 距离, 碾压) 分组批量下发
+        batch = []
+        for aid, (direction, distance, reason) in moves.items():
             # 战术移动策略：
             # 1. 默认：assault=False, is_attack_move=False (纯移动，最高优先级)
             # 2. 脆皮脱离：必须是纯移动
             # 3. MBT势场微调：启用 assault=True 以碾压步兵，但仍保持 is_attack_move=False 避免被牵制
-            
-            is_assault = False
-            
-            # 判断是否为 MBT 且非硬中断逃跑
-            # 注意：这里需要从 em 中获取单位信息来判断类型
-            if self.em:
-                entity = self.em.get_entity(aid)
-                if entity and entity.category == UnitCategory.MBT:
-                    # 如果不是硬中断逃跑 (reason 中不包含"脱离")，则开启碾压
-                    # 硬中断逃跑通常带有 "[战术硬中断:脆皮脱离]" 标签
-                    if "脱离" not in reason:
-                        is_assault = True
+            is_assault = aid in mbt_ids and reason != REASON_RETREAT
 
-            self._client.move_unit(aid, direction, distance=distance, assault=is_assault, is_attack_move=False)
-            self._log_debug(f"{reason} Move: Unit {aid} -> {direction} ({distance}) [Assault={is_assault}]")
+            batch.append((aid, direction, distance, is_assault, False))
+            if log:
+                self._log_debug(f"{reason} Move: Unit {aid} -> {direction} ({distance}) [Assault={is_assault}]")
+        self._client.move_batch(batch)
 
     def _execute_attacks(self, pairs: List[Union[Tuple[int, int], Tuple[int, int, str]]], log: bool = True) -> None:
         if not pairs or not self._client:
             return
-        for item in pairs:
-            aid = item[0]
-            tid = item[1]
-            reason = item[2] if len(item) > 2 else ""
-            
-            self._client.attack_target(aid, tid)
-            if log:
-                self._log_debug(f"{reason} Attack: Unit {aid} -> Target {tid}")
+        # 同一目标的攻击者合并为一次请求
+        self._client.attack_batch((item[0], item[1]) for item in pairs)
+        if log and self._log_enabled():
+            for item in pairs:
+                self._log_attack(item)
+
+    def _log_attack(self, item: Union[Tuple[int, int], Tuple[int, int, str]]) -> None:
+        reason = item[2] if len(item) > 2 else ""
+        self._log_debug(f"{reason} Attack: Unit {item[0]} -> Target {item[1]}")
+
+    def _log_enabled(self) -> bool:
+        """是否有日志消费方（窗口或调试输出）；逐单位日志据此跳过字符串拼接"""
+        return self._debug_on or self._log_window is not None
 
     def _log_debug(self, msg: str) -> None:
-        debug_on = str(os.environ.get("LLM_DEBUG", "0")).lower() in ("1", "true", "yes")
-        
         if self._log_window:
             self._log_window.log(msg)
             
-        if debug_on:
+        if self._debug_on:
              print(f"[TacticalCore] {msg}")
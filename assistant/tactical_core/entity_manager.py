@@ -1,14 +1,22 @@
 # -*- coding: utf-8 -*-
 from typing import Dict, List, Optional, Set, Tuple, Any, Protocol
+import bisect
+import sys
 import time
 import math
+import operator
 from dataclasses import dataclass, field
 
-from .constants import UnitCategory, UNIT_CATEGORY_MAP, IGNORED_UNIT_CODES, STANDARD_NAME_MAP
+from .constants import UnitCategory, UNIT_CATEGORY_MAP, IGNORED_UNIT_RE, STANDARD_NAME_MAP, THREAT_WEIGHT
 
-@dataclass
+_first = operator.itemgetter(0)
+
+# Python 3.10+ 以 __slots__ 生成实体：省去每个实例的 __dict__，热循环中的属性读取更快；3.9 下退化为普通 dataclass
+_DATACLASS_SLOTS = {"slots": True} if sys.version_info >= (3, 10) else {}
+
+@dataclass(**_DATACLASS_SLOTS)
 class TacticalEntity:
-    """战术实体：封装原始Actor并附加战术状态"""
+    """战术实体：封装原始Actor并附加战术状态（raw_actor 仍被硬中断读取血量，予以保留）"""
     actor_id: int
     raw_actor: dict
     unit_code: str
@@ -33,6 +41,9 @@ class EntityManager:
         self.allies: Dict[int, TacticalEntity] = {}
         self.enemies: Dict[int, TacticalEntity] = {}
         
+        # 己方按类别的二级索引 {category: {actor_id: TacticalEntity}}（类别创建后不变，随增删同步维护）
+        self.allies_by_cat: Dict[UnitCategory, Dict[int, TacticalEntity]] = {cat: {} for cat in UnitCategory}
+        
         # 距离矩阵缓存 (id_a, id_b) -> distance
         # 注意：为节省内存，仅存储必要的交互对，或在每帧计算时临时生成
         self._distance_cache: Dict[Tuple[int, int], int] = {}
@@ -47,15 +58,20 @@ class EntityManager:
         """
         raw_or_mapped = str(actor_type).lower()
         
-        # 内部标准化 (将中文别名等转为标准代码)
-        return STANDARD_NAME_MAP.get(raw_or_mapped, raw_or_mapped)
+        # 内部标准化 (将中文别名等转为标准代码)；映射表的值已驻留，未登记的代码在此驻留
+        code = STANDARD_NAME_MAP.get(raw_or_mapped)
+        return code if code is not None else sys.intern(raw_or_mapped)
 
-    def _create_or_update_entity(self, actor_data: dict, store: Dict[int, TacticalEntity]) -> Optional[TacticalEntity]:
-        """处理单个Actor的更新逻辑"""
+    def _create_or_update_entity(self, actor_data: dict, store: Dict[int, TacticalEntity],
+                                 by_cat: Optional[Dict[UnitCategory, Dict[int, TacticalEntity]]] = None) -> Optional[TacticalEntity]:
+        """处理单个Actor的更新逻辑（给出 by_cat 时新实体同时登记到类别索引）"""
         # 1. 基础有效性检查
         # 引擎特性：若单位在迷雾中，query_actor 根本不会返回该单位的数据
         # 因此，只要收到了数据，就必定包含有效信息 (position 等)
-        if not actor_data or not actor_data.get("position"):
+        if not actor_data:
+            return None
+        p = actor_data.get("position")
+        if not p:
             return None
             
         # 2. 获取代码并检查黑名单
@@ -63,7 +79,7 @@ class EntityManager:
         code = self._get_unit_code(atype)
         
         # 检查黑名单：只要包含任意黑名单关键字即过滤
-        if any(ignored in code for ignored in IGNORED_UNIT_CODES):
+        if IGNORED_UNIT_RE.search(code):
             return None
             
         aid = actor_data["id"]
@@ -75,7 +91,7 @@ class EntityManager:
         if max_hp and max_hp > 0 and hp is not None:
             hp_ratio = float(hp) / float(max_hp)
             
-        pos = (actor_data["position"]["x"], actor_data["position"]["y"])
+        pos = (p["x"], p["y"])
         
         # 4. 更新或创建
         if aid in store:
@@ -99,6 +115,8 @@ class EntityManager:
                 position=pos
             )
             store[aid] = entity
+            if by_cat is not None:
+                by_cat[cat][aid] = entity
             
         return entity
 
@@ -116,14 +134,12 @@ class EntityManager:
         raw_allies = []
         raw_enemies = []
         try:
-            # 查询己方
-            resp_allies = self.client.query_all_units(faction="己方")
+            # 己方/敌方两次查询并发进行
+            resp_allies, resp_enemies = self.client.query_all_units_both()
             if resp_allies is None:
                 raise ConnectionError("Failed to query allies")
             raw_allies = resp_allies
             
-            # 查询敌方
-            resp_enemies = self.client.query_all_units(faction="敌方")
             if resp_enemies is None:
                 raise ConnectionError("Failed to query enemies")
             raw_enemies = resp_enemies
@@ -132,76 +148,78 @@ class EntityManager:
             # 关键修复：如果连接断开，应该清空所有实体，而不是保持僵尸状态
             self.allies.clear()
             self.enemies.clear()
+            for bucket in self.allies_by_cat.values():
+                bucket.clear()
             return
 
         # --- 2. 同步状态 (Mark & Sweep) ---
         
         # 己方同步
         current_ally_ids = set()
+        seen = current_ally_ids.add
         for actor in raw_allies:
-            ent = self._create_or_update_entity(actor, self.allies)
+            ent = self._create_or_update_entity(actor, self.allies, self.allies_by_cat)
             if ent:
-                current_ally_ids.add(ent.actor_id)
+                seen(ent.actor_id)
         
-        # 清理消失的己方单位
-        for aid in list(self.allies.keys()):
-            if aid not in current_ally_ids:
-                del self.allies[aid]
+        # 清理消失的己方单位（键视图差集，仅遍历已消失的ID）
+        for aid in self.allies.keys() - current_ally_ids:
+            ent = self.allies.pop(aid)
+            self.allies_by_cat[ent.category].pop(aid, None)
                 
         # 敌方同步
         current_enemy_ids = set()
+        seen = current_enemy_ids.add
         for actor in raw_enemies:
             ent = self._create_or_update_entity(actor, self.enemies)
             if ent:
-                current_enemy_ids.add(ent.actor_id)
+                seen(ent.actor_id)
                 
         # 清理消失的敌方单位
-        for aid in list(self.enemies.keys()):
-            if aid not in current_enemy_ids:
-                del self.enemies[aid]
+        for aid in self.enemies.keys() - current_enemy_ids:
+            del self.enemies[aid]
 
         # --- 3. 计算衍生数据 (威胁值与距离) ---
         self._calculate_threat_levels()
 
-    def _manhattan_dist(self, pos1: Tuple[int, int], pos2: Tuple[int, int]) -> int:
-        return abs(pos1[0] - pos2[0]) + abs(pos1[1] - pos2[1])
-
     def _calculate_threat_levels(self):
         """
         计算每个己方单位的威胁等级
         Threat = sum(Enemy_Weight / Distance) for enemies in range
         """
-        # 简单的威胁评估示例：
-        # 对每个己方单位，遍历所有敌方单位，如果距离够近，则累加威胁值
-        # 优化：仅对核心战斗单位计算
-        
-        for ally in self.allies.values():
-            if ally.category == UnitCategory.OTHER:
+        # 敌方按 x 排序后预取坐标与类别：每个己方单位只需二分出 |dx|<=15 的窗口，
+        # 避免对全体敌方做 allies × enemies 次 Python 级循环
+        enemies = sorted(
+            ((e.position[0], e.position[1], e.category) for e in self.enemies.values()),
+            key=_first,
+        )
+        enemy_xs = [e[0] for e in enemies]
+        other = UnitCategory.OTHER
+
+        # 优化：仅对核心战斗单位计算（按类别索引直接跳过 OTHER 桶）
+        for cat, bucket in self.allies_by_cat.items():
+            if cat is other or not bucket:
                 continue
-                
-            threat = 0.0
-            ax, ay = ally.position
-            
-            for enemy in self.enemies.values():
-                ex, ey = enemy.position
-                dist = abs(ax - ex) + abs(ay - ey)
-                
-                # 忽略过远的敌人 (例如 > 15格)
-                if dist > 15:
-                    continue
-                
-                # 基础威胁权重 (可根据 enemy.category 细化)
-                base_threat = 10.0
-                if enemy.category == UnitCategory.ARTY:
-                    base_threat = 15.0 # 火炮高威胁
-                elif enemy.category == UnitCategory.INF_AT and ally.category in (UnitCategory.MBT, UnitCategory.AFV):
-                    base_threat = 20.0 # 反坦克步兵对载具高威胁
-                
-                # 距离衰减：距离越近威胁越大，防止除零
-                weight = base_threat / max(1.0, float(dist))
-                threat += weight
-            
-            ally.threat_level = threat
+            # 基础威胁权重按 (己方类别, 敌方类别) 查表，同类别单位共用一行
+            weights = THREAT_WEIGHT[cat]
+
+            for ally in bucket.values():
+                threat = 0.0
+                ax, ay = ally.position
+
+                lo = bisect.bisect_left(enemy_xs, ax - 15)
+                hi = bisect.bisect_right(enemy_xs, ax + 15)
+                for ex, ey, ecat in enemies[lo:hi]:
+                    dist = abs(ax - ex) + abs(ay - ey)
+
+                    # 忽略过远的敌人 (例如 > 15格)
+                    if dist > 15:
+                        continue
+
+                    # 距离衰减：距离越近威胁越大，防止除零
+                    threat += weights[ecat] / (dist if dist > 1 else 1.0)
+
+                ally.threat_level = threat
 
     def get_entity(self, actor_id: int) -> Optional[TacticalEntity]:
         """通过ID获取实体（己方或敌方）"""
@@ -212,7 +230,9 @@ class EntityManager:
         ea = self.get_entity(id_a)
         eb = self.get_entity(id_b)
         if ea and eb:
-            return self._manhattan_dist(ea.position, eb.position)
+            ax, ay = ea.position
+            bx, by = eb.position
+            return abs(ax - bx) + abs(ay - by)
         return 9999
 
     def update_assignment(self, attacker_id: int, target_id: Optional[int]) -> None:
@@ -1,7 +1,17 @@
 # -*- coding: utf-8 -*-
+import time
+from math import hypot as _hypot
 from typing import Dict, List, Tuple, Optional
 from .entity_manager import EntityManager, TacticalEntity
-from .constants import UnitCategory
+from .constants import UnitCategory, VEHICLE_CATEGORIES, ATTACK_RANGES
+
+# 硬中断逃跑的移动标签（执行层据此关闭 MBT 碾压）
+REASON_RETREAT = "[战术硬中断:脆皮脱离]"
+
+# 类别成员的模块级别名：UnitCategory.X 每次都要经枚举类属性查找，热路径上直接比较别名
+_MBT, _INF_AT = UnitCategory.MBT, UnitCategory.INF_AT
+_FRAGILE_CATEGORIES = frozenset((UnitCategory.ARTY, UnitCategory.AFV))  # 脆皮：需要脱离
+_range_of = ATTACK_RANGES.get
 
 class InterruptLogic:
     """
@@ -12,8 +22,6 @@ class InterruptLogic:
         self.em = entity_manager
         # 冷却时间记录 {actor_id: cooldown_end_time}
         self._retreat_cooldowns = {}
-        import time
-        self._time = time
 
         # 攻击锁定状态 {attacker_id: (target_id, timestamp)}
         self._attack_locks = {}
@@ -35,20 +43,20 @@ class InterruptLogic:
         # 1. 维护攻击锁定状态
         # 虽然 L2/L3 已改为动态机制，但为了兼容性或未来其他逻辑可能需要锁定，保留此清理逻辑
         # 如果 self._attack_locks 为空，此循环开销极小
-        for attacker_id in list(self._attack_locks.keys()):
-            target_id, _ = self._attack_locks[attacker_id]
+        attack_locks = self._attack_locks
+        for attacker_id, (target_id, _) in list(attack_locks.items()):
             if target_id not in active_enemy_ids:
-                del self._attack_locks[attacker_id]
+                del attack_locks[attacker_id]
         
         for ally in self.em.allies.values():
             if not ally.is_active:
                 continue
                 
             # L1: 脆皮脱离 (High Priority)
-            if ally.category in (UnitCategory.ARTY, UnitCategory.AFV):
+            if ally.category in _FRAGILE_CATEGORIES:
                 if ally.health_ratio < 0.35:
                     # 检查冷却时间，避免过于频繁触发撤退导致无法重新投入战斗或来回鬼畜
-                    now = self._time.time()
+                    now = time.time()
                     cooldown_end = self._retreat_cooldowns.get(ally.actor_id, 0.0)
                     if now < cooldown_end:
                         pass # 冷却中，继续检查其他逻辑（如是否有锁定目标需要继续攻击）
@@ -59,25 +67,25 @@ class InterruptLogic:
                             escape_dir = self._invert_direction(threat_dir)
                             if escape_dir:
                                 # 逃跑不再受限于单步微调，distance=3以快速脱离
-                                moves[ally.actor_id] = (escape_dir, 3, "[战术硬中断:脆皮脱离]")
+                                moves[ally.actor_id] = (escape_dir, 3, REASON_RETREAT)
                                 # 设置冷却时间 5 秒，给单位时间执行移动和重新评估
                                 self._retreat_cooldowns[ally.actor_id] = now + 5.0
                                 # 逃跑时不再执行其他逻辑，也不再维持攻击锁定
-                                if ally.actor_id in self._attack_locks:
-                                    del self._attack_locks[ally.actor_id]
+                                attack_locks.pop(ally.actor_id, None)
                                 continue
 
             # 优先检查是否存在有效的攻击锁定
             # 如果之前已经锁定了某个硬中断目标，且该目标仍存活，则继续攻击该目标，避免频繁切换
-            if ally.actor_id in self._attack_locks:
-                target_id, _ = self._attack_locks[ally.actor_id]
+            lock = attack_locks.get(ally.actor_id)
+            if lock is not None:
+                target_id, _ = lock
                 # 再次确认目标是否在射程内/符合条件（可选，这里简化为只要存活就继续打，直到死）
                 attacks.append((ally.actor_id, target_id, "[战术硬中断:锁定追击]"))
                 continue
 
             # L2: 装甲收割 (High Priority - Promotion)
             # 敌载具 (MBT/ARTY/AFV) HP<35% -> 范围内 MBT 强制集火
-            if ally.category == UnitCategory.MBT:
+            if ally.category is _MBT:
                 # 寻找攻击范围内的残血敌军载具
                 target_low_hp = self._find_low_hp_enemy_in_range(ally, active_enemies)
                 if target_low_hp:
@@ -91,7 +99,7 @@ class InterruptLogic:
             # 注意：因为 4TNK 有副武器可有效对付步兵，或者需要优先清除高威胁单位（比如以后可以加飞机）
             if ally.unit_code == "4tnk":
                 # 寻找最近的反坦克步兵 (INF_AT)
-                target_at = self._find_nearest_enemy_by_category(ally, active_enemies, UnitCategory.INF_AT, range_limit=6)
+                target_at = self._find_nearest_enemy_by_category(ally, active_enemies, _INF_AT, range_limit=6)
                 if target_at:
                     attacks.append((ally.actor_id, target_at.actor_id, "[战术硬中断:威胁剥离]"))
                     # 动态机制：不设置锁定，每一帧都重新评估，确保总是攻击最近的威胁
@@ -108,7 +116,7 @@ class InterruptLogic:
         
         for e in enemies:
             # 仅认为 MBT 是主要威胁，避免因步兵等低威胁单位导致过度撤退
-            if e.category == UnitCategory.MBT:
+            if e.category is _MBT:
                 ex, ey = e.position
                 dist = abs(mx - ex) + abs(my - ey)
                 if dist < min_dist:
@@ -134,7 +142,7 @@ class InterruptLogic:
         min_dist = range_limit + 1
         
         for e in enemies:
-            if e.category == target_category:
+            if e.category is target_category:
                 ex, ey = e.position
                 dist = abs(mx - ex) + abs(my - ey)
                 if dist < min_dist:
@@ -148,40 +156,27 @@ class InterruptLogic:
         寻找攻击范围内的残血敌军载具
         优先选择血量最低的单位
         """
-        import math
-        
-        # 攻击范围定义 (保守值)
-        ranges = {
-            "v2rl": 10.0,
-            "3tnk": 4.75,
-            "4tnk": 4.75,
-            "ftrk": 6.0,
-            "e1": 5.0,
-            "e3": 5.0
-        }
-        
-        my_range = ranges.get(me.unit_code, 4.0)
+        # 攻击范围 (保守值，见 ATTACK_RANGES)
+        my_range = _range_of(me.unit_code, 4.0)
         mx, my = me.position
         
-        candidates = []
+        # 单遍取优先级最高者: 1. 血量最低 2. 距离最近（并列时保留先出现的）
+        best = None
+        best_key = None
         
         for e in enemies:
             # 筛选残血载具 (MBT/ARTY/AFV)
-            if e.category in (UnitCategory.MBT, UnitCategory.ARTY, UnitCategory.AFV):
+            if e.category in VEHICLE_CATEGORIES:
                 if e.health_ratio < 0.35:
                     ex, ey = e.position
                     # 使用欧几里得距离进行精确范围判定
-                    dist = math.hypot(mx - ex, my - ey)
+                    dist = _hypot(mx - ex, my - ey)
                     
                     if dist <= my_range:
                         # 获取绝对血量用于排序 (若无则用比例)
                         hp = e.raw_actor.get("hp", 9999)
-                        candidates.append((hp, dist, e))
-        
-        if not candidates:
-            return None
-            
-        # 排序优先级: 1. 血量最低 2. 距离最近
-        candidates.sort(key=lambda x: (x[0], x[1]))
+                        key = (hp, dist)
+                        if best is None or key < best_key:
+                            best, best_key = e, key
         
-        return candidates[0][2]
+        return best
@@ -1,8 +1,54 @@
 # -*- coding: utf-8 -*-
-import math
+import bisect
+import operator
+from math import hypot as _hypot
 from typing import Dict, List, Tuple, Optional
 from .entity_manager import EntityManager, TacticalEntity
-from .constants import UnitCategory
+from .constants import UnitCategory, VEHICLE_CATEGORIES, INFANTRY_CATEGORIES, ATTACK_RANGES
+
+# 势场微操的移动标签
+REASON_FIELD = "[势场微操]"
+
+_by_index = operator.itemgetter(1)
+
+# 类别成员的模块级别名：UnitCategory.X 每次都要经枚举类属性查找，热路径上直接比较别名
+_ARTY, _MBT, _AFV = UnitCategory.ARTY, UnitCategory.MBT, UnitCategory.AFV
+_INF_MEAT, _INF_AT = UnitCategory.INF_MEAT, UnitCategory.INF_AT
+_ARMORED_CATEGORIES = frozenset((_MBT, _AFV))
+_range_of = ATTACK_RANGES.get
+
+
+def _x_sorted(entities: List[TacticalEntity]) -> Tuple[List[int], List[Tuple[int, int, int, TacticalEntity]]]:
+    """按 x 排序的 (x, 原顺序下标, y, 实体) 列表及对应 x 列表，供按 |dx| 窗口检索"""
+    entries = sorted((e.position[0], i, e.position[1], e) for i, e in enumerate(entities))
+    return [entry[0] for entry in entries], entries
+
+
+def _x_window(xs: List[int], entries: List[Tuple[int, int, int, TacticalEntity]], x: float, radius: float) -> List[Tuple[int, int, int, TacticalEntity]]:
+    """|dx| <= radius 的候选，按原顺序返回（累加顺序与逐个遍历一致）"""
+    lo = bisect.bisect_left(xs, x - radius)
+    hi = bisect.bisect_right(xs, x + radius)
+    if hi - lo > 1:
+        return sorted(entries[lo:hi], key=_by_index)
+    return entries[lo:hi]
+
+
+class _EnemyIndex:
+    """
+    每帧构建一次的敌方索引：
+    - 按类别筛好的存活目标列表，各己方单位共用，不再逐个单位重新筛选
+    - 有距离上限的力（死亡区域斥力、装甲收割引力）只需检索 x 窗口内的敌人，不必扫描全部敌人
+    """
+    __slots__ = ("arty", "priority", "inf_at_xs", "inf_at", "low_hp_xs", "low_hp")
+
+    def __init__(self, enemies: List[TacticalEntity]):
+        # 最近目标搜索只考虑存活单位
+        self.arty = [e for e in enemies if e.category is _ARTY and e.is_active]
+        self.priority = [e for e in enemies if (e.category is _ARTY or e.category is _INF_AT) and e.is_active]
+        self.inf_at_xs, self.inf_at = _x_sorted([e for e in enemies if e.category is _INF_AT])
+        self.low_hp_xs, self.low_hp = _x_sorted(
+            [e for e in enemies if e.category in VEHICLE_CATEGORIES and e.health_ratio < 0.35]
+        )
 
 class PotentialField:
     """
@@ -33,15 +79,8 @@ class PotentialField:
         self.DIST_FRIENDLY_REP = 2.0     # 友军斥力生效距离
         self.DIST_DEATHZONE = 5.0        # 死亡区域斥力生效距离
         
-        # 攻击距离参数 (保守值 - 使用浮点数以便精确计算)
-        self.ranges = {
-            "v2rl": 10.0,
-            "3tnk": 4.75,
-            "4tnk": 4.75,
-            "ftrk": 6.0,
-            "e1": 5.0,
-            "e3": 5.0
-        }
+        # 攻击距离参数 (共用模块级只读表，保留属性以兼容外部读取)
+        self.ranges = ATTACK_RANGES
 
     def calculate_moves(self, allies: List[TacticalEntity]) -> Dict[int, Tuple[str, int, str]]:
         """
@@ -51,25 +90,16 @@ class PotentialField:
         """
         # 获取所有敌军列表
         enemies = list(self.em.enemies.values())
+        index = _EnemyIndex(enemies)
         
-        # 构建己方空间网格 (优化友军斥力计算)
-        spatial_grid: Dict[Tuple[int, int], List[TacticalEntity]] = {}
-        for ally in allies:
-            if not ally.is_active:
-                continue
-            cx, cy = ally.position[0] // self.cell_size, ally.position[1] // self.cell_size
-            key = (cx, cy)
-            if key not in spatial_grid:
-                spatial_grid[key] = []
-            spatial_grid[key].append(ally)
+        # 构建己方空间网格 (优化友军斥力计算)，得到每个单位所在网格的步兵邻居
+        active_allies = [ally for ally in allies if ally.is_active]
+        neighbors_of = self._neighbor_lists(active_allies)
 
         moves = {}
-        for ally in allies:
-            if not ally.is_active:
-                continue
-                
+        for ally, neighbors in zip(active_allies, neighbors_of):
             # 计算合力
-            fx, fy = self._compute_force(ally, enemies, spatial_grid)
+            fx, fy = self._compute_force(ally, enemies, neighbors, index)
             
             # 阈值过滤 (防止抖动)
             if abs(fx) < 0.1 and abs(fy) < 0.1:
@@ -79,12 +109,13 @@ class PotentialField:
             direction = self._vector_to_direction(fx, fy)
             if direction:
                 # 强制步长为 1，确保微操的平滑性
-                moves[ally.actor_id] = (direction, 1, "[势场微操]")
+                moves[ally.actor_id] = (direction, 1, REASON_FIELD)
                 
         return moves
 
     def _compute_force(self, me: TacticalEntity, enemies: List[TacticalEntity], 
-                       spatial_grid: Dict[Tuple[int, int], List[TacticalEntity]]) -> Tuple[float, float]:
+                       neighbors: List[Tuple[int, int, int]],
+                       index: _EnemyIndex) -> Tuple[float, float]:
         """计算作用在单位上的合力 (引力 - 斥力)"""
         fx, fy = 0.0, 0.0
         mx, my = me.position
@@ -102,7 +133,7 @@ class PotentialField:
                 
                 dist = abs(tx - mx) + abs(ty - my)
                 # 获取该单位攻击范围
-                atk_range = self.ranges.get(me.unit_code, 3)
+                atk_range = _range_of(me.unit_code, 3)
                 
                 # 如果距离大于射程，则产生引力
                 if dist > atk_range:
@@ -114,8 +145,8 @@ class PotentialField:
                     
         # 1.2 高价值目标引力 (High Value Attraction)
         # AFV -> ARTY (切后排)
-        if me.category == UnitCategory.AFV:
-            target_arty = self._find_nearest(me, [e for e in enemies if e.category == UnitCategory.ARTY])
+        if me.category is _AFV:
+            target_arty = self._find_nearest(me, index.arty)
             if target_arty:
                 tx, ty = target_arty.position
                 dx, dy = tx - mx, ty - my
@@ -125,9 +156,9 @@ class PotentialField:
 
         # 1.3 炮灰冲锋引力 (Fodder Charge)
         # INF_MEAT -> Enemy
-        if me.category == UnitCategory.INF_MEAT:
+        if me.category is _INF_MEAT:
             # 优先找高优目标 (ARTY/INF_AT)
-            target_prio = self._find_nearest(me, [e for e in enemies if e.category in (UnitCategory.ARTY, UnitCategory.INF_AT)])
+            target_prio = self._find_nearest(me, index.priority)
             if target_prio:
                 tx, ty = target_prio.position
                 dx, dy = tx - mx, ty - my
@@ -146,28 +177,25 @@ class PotentialField:
         
         # 1.4 装甲收割引力 (Armor Harvest Attraction)
         # MBT -> 攻击范围外的残血载具
-        if me.category == UnitCategory.MBT:
+        if me.category is _MBT:
             # 寻找附近的残血载具
             # 只对范围在 (Range, Range + 4) 之间的单位产生引力
             # 范围内的由硬中断接管，范围外的太远不管
-            my_range = self.ranges.get(me.unit_code, 4.0)
+            my_range = _range_of(me.unit_code, 4.0)
             attract_min_dist = my_range
             attract_max_dist = my_range + 4.0
             
-            # 筛选符合条件的敌人
-            candidates = []
-            for e in enemies:
-                if e.category in (UnitCategory.MBT, UnitCategory.ARTY, UnitCategory.AFV) and e.health_ratio < 0.35:
-                    ex, ey = e.position
-                    # 距离计算
-                    dist = math.hypot(mx - ex, my - ey)
-                    if attract_min_dist < dist < attract_max_dist:
-                        candidates.append((dist, e))
+            # 筛选符合条件的敌人（索引中已是残血载具，只检索 |dx| 不超过上限的窗口），单遍取最近的一个
+            nearest_low_hp = None
+            nearest_dist = 0.0
+            for ex, _, ey, e in _x_window(index.low_hp_xs, index.low_hp, mx, attract_max_dist):
+                # 距离计算
+                dist = _hypot(mx - ex, my - ey)
+                if attract_min_dist < dist < attract_max_dist and (nearest_low_hp is None or dist < nearest_dist):
+                    nearest_low_hp, nearest_dist = e, dist
             
             # 选最近的一个产生引力
-            if candidates:
-                candidates.sort(key=lambda x: x[0])
-                nearest_low_hp = candidates[0][1]
+            if nearest_low_hp is not None:
                 ex, ey = nearest_low_hp.position
                 dx, dy = ex - mx, ey - my
                 norm = max(abs(dx) + abs(dy), 0.1)
@@ -180,10 +208,8 @@ class PotentialField:
 
         # 2.1 死亡区域斥力 (Death Zone Repulsion)
         # MBT/AFV 避开 INF_AT
-        if me.category in (UnitCategory.MBT, UnitCategory.AFV):
-            danger_infs = [e for e in enemies if e.category == UnitCategory.INF_AT]
-            for inf in danger_infs:
-                ex, ey = inf.position
+        if me.category in _ARMORED_CATEGORIES:
+            for ex, _, ey, _ in _x_window(index.inf_at_xs, index.inf_at, mx, self.DIST_DEATHZONE):
                 dist = abs(ex - mx) + abs(ey - my)
                 
                 if dist < self.DIST_DEATHZONE:
@@ -194,45 +220,57 @@ class PotentialField:
                     fy += dy * weight
 
         # 2.2 友方碰撞斥力 (Friendly Collision)
-        # 步兵散开，避免被一锅端
-        is_infantry = me.category in (UnitCategory.INF_MEAT, UnitCategory.INF_AT)
-        
-        if is_infantry:
-            neighbors = self._get_neighbors(me, spatial_grid)
-            for ally in neighbors:
-                if ally.actor_id == me.actor_id:
+        # 步兵散开，避免被一锅端（步兵只斥步兵，邻居列表中已只有步兵的 (id, x, y)）
+        if me.category in INFANTRY_CATEGORIES:
+            my_id = me.actor_id
+            rep_dist = self.DIST_FRIENDLY_REP # 2格
+            rep_weight = self.W_REP_FRIENDLY
+            for aid, ax, ay in neighbors:
+                if aid == my_id:
                     continue
-                
-                # 判断是否需要排斥
-                ally_is_infantry = ally.category in (UnitCategory.INF_MEAT, UnitCategory.INF_AT)
-                
-                should_repel = False
-                # 步兵斥步兵
-                if is_infantry and ally_is_infantry:
-                    should_repel = True
-                
-                if should_repel:
-                    ax, ay = ally.position
-                    dist = abs(ax - mx) + abs(ay - my)
-                    
-                    if dist < self.DIST_FRIENDLY_REP: # 2格
-                        dx, dy = mx - ax, my - ay
-                        weight = self.W_REP_FRIENDLY / (dist + 0.1)
-                        fx += dx * weight
-                        fy += dy * weight
+                dist = abs(ax - mx) + abs(ay - my)
+                if dist < rep_dist:
+                    dx, dy = mx - ax, my - ay
+                    weight = rep_weight / (dist + 0.1)
+                    fx += dx * weight
+                    fy += dy * weight
 
         return fx, fy
 
-    def _get_neighbors(self, me: TacticalEntity, spatial_grid: Dict[Tuple[int, int], List[TacticalEntity]]) -> List[TacticalEntity]:
-        """获取周围 3x3 网格内的友军"""
-        cx, cy = me.position[0] // self.cell_size, me.position[1] // self.cell_size
-        neighbors = []
-        for dx in [-1, 0, 1]:
-            for dy in [-1, 0, 1]:
-                key = (cx + dx, cy + dy)
-                if key in spatial_grid:
-                    neighbors.extend(spatial_grid[key])
-        return neighbors
+    def _neighbor_lists(self, allies: List[TacticalEntity]) -> List[List[Tuple[int, int, int]]]:
+        """
+        按单位顺序返回其所在网格周围 3x3 网格内的友军步兵 (actor_id, x, y)（同格单位共用一份列表）
+        仅步兵之间存在友军斥力，列表中只放步兵
+        网格为按己方包围盒分配的扁平数组，下标 = 列 * 高 + 行，不再以 (cx, cy) 元组做字典键
+        """
+        if not allies:
+            return []
+        cs = self.cell_size
+        cxs = [a.position[0] // cs for a in allies]
+        cys = [a.position[1] // cs for a in allies]
+        min_cx, min_cy = min(cxs), min(cys)
+        # 四周各留一圈空网格，3x3 邻域下标无需越界判断
+        h = max(cys) - min_cy + 3
+        size = (max(cxs) - min_cx + 3) * h
+        cells = [(cx - min_cx + 1) * h + (cy - min_cy + 1) for cx, cy in zip(cxs, cys)]
+
+        infantry_by_cell: List[List[Tuple[int, int, int]]] = [[] for _ in range(size)]
+        for a, cell in zip(allies, cells):
+            if a.category in INFANTRY_CATEGORIES:
+                infantry_by_cell[cell].append((a.actor_id,) + tuple(a.position))
+
+        # 邻域偏移按 dx、dy 依次取 -1/0/1 的顺序排列，与逐格遍历的累加顺序一致
+        offsets = [dx * h + dy for dx in (-1, 0, 1) for dy in (-1, 0, 1)]
+        neighbors_by_cell: List[Optional[List[Tuple[int, int, int]]]] = [None] * size
+        for cell in cells:
+            if neighbors_by_cell[cell] is not None:
+                continue
+            neighbors = []
+            if infantry_by_cell[cell]:
+                for off in offsets:
+                    neighbors.extend(infantry_by_cell[cell + off])
+            neighbors_by_cell[cell] = neighbors
+        return [neighbors_by_cell[cell] for cell in cells]
 
     def _find_nearest(self, me: TacticalEntity, candidates: List[TacticalEntity]) -> Optional[TacticalEntity]:
         """寻找最近的实体"""
@@ -1,10 +1,13 @@
 # -*- coding: utf-8 -*-
 import tkinter as tk
 import threading
-import queue
 import time
+from collections import deque
 from typing import Optional
 
+# 日志窗口最多保留的行数（超出后删除最早的行，避免 Text 控件无限增长）
+_MAX_LINES = 2000
+
 class TacticalLogWindow:
     """
     轻量级半透明日志窗口，用于显示战术核心的实时状态
@@ -12,7 +15,8 @@ class TacticalLogWindow:
     def __init__(self):
         self.root: Optional[tk.Tk] = None
         self.text_area = None
-        self.queue = queue.Queue()
+        # 后台线程 append、UI 线程 popleft，二者在 CPython 中均为原子操作，无需额外加锁
+        self.queue = deque(maxlen=_MAX_LINES)
         self.running = False
         self._thread = None
 
@@ -37,7 +41,7 @@ class TacticalLogWindow:
         if self.running:
             try:
                 timestamp = time.strftime("%H:%M:%S", time.localtime())
-                self.queue.put(f"[{timestamp}] {message}")
+                self.queue.append(f"[{timestamp}] {message}")
             except Exception:
                 pass
 
@@ -83,14 +87,23 @@ class TacticalLogWindow:
         if not self.running:
             return
             
-        while not self.queue.empty():
+        # 一次取空队列，合并为单次 insert，突发日志时不再逐条调用 Tk
+        dq = self.queue
+        batch = []
+        while dq:
+            batch.append(dq.popleft())
+        if batch and self.text_area:
             try:
-                msg = self.queue.get_nowait()
-                if self.text_area:
-                    self.text_area.insert(tk.END, msg + "\n")
-                    self.text_area.see(tk.END)
-            except queue.Empty:
-                break
-        
+                text_area = self.text_area
+                text_area.insert(tk.END, "\n".join(batch) + "\n")
+                # 末尾总有一个空行，故行数 = 行号 - 1
+                excess = int(text_area.index("end-1c").split(".")[0]) - 1 - _MAX_LINES
+                if excess > 0:
+                    text_area.delete("1.0", f"{excess + 1}.0")
+                text_area.see(tk.END)
+            except tk.TclError:
+                # 控件已销毁
+                pass
+
         if self.root:
             self.root.after(100, self._update_log)